@@ -0,0 +1,115 @@
+"""
+Compare `zkstats.core.setup`, which always writes the proving key, with `lib.setup_vk`, which
+discards it.
+
+Each run happens in a fresh process so that peak RSS is measured independently:
+
+    poetry run python benchmarks/setup_vk.py --repeat 5
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+assets_dir = os.path.join(root_dir, "tests", "assets")
+sys.path.append(root_dir)
+
+DATA_SHAPE = {"x": 7, "y": 7}
+COMPUTATION = """def computation(state: State, args: Args):
+    x = args["x"]
+    y = args["y"]
+    return state.mean(x), state.mean(y)
+"""
+
+VARIANTS = ("with_pk", "vk_only")
+
+
+def prepare_model(model_dir: str):
+    from zkstats.computation import computation_to_model
+    from zkstats.core import create_dummy, verifier_define_calculation
+
+    from lib import extract_safe_computation
+
+    c = extract_safe_computation(COMPUTATION)
+    precal_witness_path = os.path.join(assets_dir, "precal_witness.json")
+    selected_columns, _, verifier_model = computation_to_model(c, precal_witness_path, DATA_SHAPE, isProver=False)
+    dummy_data_path = os.path.join(model_dir, "dummy_data.json")
+    create_dummy(DATA_SHAPE, dummy_data_path)
+    verifier_define_calculation(
+        dummy_data_path,
+        selected_columns,
+        os.path.join(model_dir, "sel_dummy_data.json"),
+        verifier_model,
+        os.path.join(model_dir, "model.onnx"),
+    )
+
+
+def run_variant(variant: str, model_dir: str):
+    # Import before timing so that only the setup itself is measured
+    from zkstats.core import setup
+
+    from lib import compile_circuit, setup_vk
+
+    settings_path = os.path.join(assets_dir, "settings.json")
+    with tempfile.TemporaryDirectory() as out_dir:
+        model_path = os.path.join(model_dir, "model.onnx")
+        compiled_model_path = os.path.join(out_dir, "model.compiled")
+        vk_path = os.path.join(out_dir, "model.vk")
+        pk_path = os.path.join(out_dir, "model.pk")
+        start = time.perf_counter()
+        if variant == "with_pk":
+            setup(model_path, compiled_model_path, settings_path, vk_path, pk_path)
+        else:
+            compile_circuit(model_path, compiled_model_path, settings_path)
+            setup_vk(compiled_model_path, settings_path, vk_path)
+        wall_time = time.perf_counter() - start
+        pk_bytes = os.path.getsize(pk_path) if os.path.exists(pk_path) else 0
+    # ru_maxrss is in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps({"variant": variant, "wall_time": wall_time, "peak_rss": peak_rss, "pk_bytes": pk_bytes}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--run", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--model-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_variant(args.run, args.model_dir)
+        return
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        prepare_model(model_dir)
+        results = {variant: [] for variant in VARIANTS}
+        for _ in range(args.repeat):
+            for variant in VARIANTS:
+                out = subprocess.run(
+                    [sys.executable, __file__, "--run", variant, "--model-dir", model_dir],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+                # zkstats prints progress, the result is the last line
+                results[variant].append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    summary = {}
+    for variant, runs in results.items():
+        summary[variant] = {
+            "wall_time_min": min(r["wall_time"] for r in runs),
+            "wall_time_mean": sum(r["wall_time"] for r in runs) / len(runs),
+            "peak_rss_max": max(r["peak_rss"] for r in runs),
+            "pk_bytes": runs[0]["pk_bytes"],
+        }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+"""
+Benchmark verification key generation and proof verification, through `lib` directly and through
+the HTTP app, and print the results as JSON:
+
+    poetry run python benchmarks/suite.py --shapes 7,64 --complexity 1,2,4 --concurrency 1,4 --output results.json
+
+Key generation is swept over data shapes (rows per column), computation complexity (number of
+statistics in the computation) and concurrency. Every request uses distinct witness values, which
+are part of the circuit, so no key, model or compiled circuit is served from a cache. Both targets
+keep a stage cache per configuration, like the server does, so only the dummy data of a data shape
+is reused after the first request. Verification is swept over concurrency only, as the fixtures in
+`tests/assets` hold a single proof. The server is started with the verification cache disabled.
+
+Each configuration runs in fresh processes, a worker pool for `lib` or a server for `http`, so
+that peak RSS is measured independently. Results contain latency percentiles, throughput, peak RSS
+of all processes involved and the latency of each stage, as reported in `Server-Timing` for `http`.
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from importlib import metadata
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+assets_dir = os.path.join(root_dir, "tests", "assets")
+sys.path.append(root_dir)
+
+# The computation, data shape and witness the proof fixture was generated for
+FIXTURE_DATA_SHAPE = {"x": 7, "y": 7}
+FIXTURE_PRECAL_WITNESS = {"Mean_0": [51.54285430908203], "Mean_1": [4.085714340209961]}
+COLUMNS = ("x", "y")
+
+TARGETS = ("lib", "http")
+# As the server's default `ZKSTATS_STAGE_CACHE_MAX_BYTES`
+STAGE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+SERVER_START_TIMEOUT = 120
+
+
+def read_asset(name: str) -> str:
+    with open(os.path.join(assets_dir, name), "r") as asset_file:
+        return asset_file.read()
+
+
+def make_computation(complexity: int, run_id: int) -> tuple[str, str]:
+    # A computation of `complexity` means over the columns, and a precal witness for it. The
+    # witness values do not need to match the data to generate a key. They are offset by `run_id`
+    # and end up in the model, so each run compiles a circuit of its own. Run 0 matches the fixture.
+    lines = ["def computation(state: State, args: Args):"]
+    lines += [f'    {column} = args["{column}"]' for column in COLUMNS]
+    means = [f"state.mean({COLUMNS[i % len(COLUMNS)]})" for i in range(complexity)]
+    lines.append(f"    return {', '.join(means)}")
+    precal_witness = {
+        f"Mean_{i}": [value + run_id for value in FIXTURE_PRECAL_WITNESS[f"Mean_{i % len(COLUMNS)}"]]
+        for i in range(complexity)
+    }
+    return "\n".join(lines) + "\n", json.dumps(precal_witness)
+
+
+def make_settings(logrows: int | None) -> str:
+    settings = json.loads(read_asset("settings.json"))
+    if logrows is not None:
+        # More rows than the calibrated settings ask for are needed by larger data shapes
+        settings["run_args"]["logrows"] = logrows
+    return json.dumps(settings)
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    # Linear interpolation between the closest ranks
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def summarize(values: list[float]) -> dict[str, float] | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        "min": values[0],
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": values[-1],
+    }
+
+
+def summarize_runs(runs: list[dict], wall_time: float, peak_rss: int | None) -> dict:
+    succeeded = [run for run in runs if "error" not in run]
+    stage_names = sorted({name for run in succeeded for name in run["stages"]})
+    return {
+        "requests": len(runs),
+        "errors": len(runs) - len(succeeded),
+        "error_samples": sorted({run["error"] for run in runs if "error" in run})[:3],
+        "wall_time": wall_time,
+        "throughput": len(succeeded) / wall_time,
+        "latency": summarize([run["latency"] for run in succeeded]),
+        "stages": {
+            name: summarize([run["stages"][name] for run in succeeded if name in run["stages"]])
+            for name in stage_names
+        },
+        "peak_rss": peak_rss,
+    }
+
+
+def run_concurrently(submit, tasks: list, concurrency: int) -> tuple[list[dict], float]:
+    # Run `submit(*task)` for every task with at most `concurrency` at once
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        runs = list(executor.map(lambda task: submit(*task), tasks))
+    return runs, time.perf_counter() - start
+
+
+# ### `lib` target
+
+def lib_warm_up(delay: float) -> int:
+    # Import the proving stack outside of the measurements, and wait so that every worker of the
+    # pool gets one warm-up task
+    import lib  # noqa: F401
+    time.sleep(delay)
+    return os.getpid()
+
+
+def lib_calculate_vk(
+    data_shape_json: str,
+    computation: str,
+    settings_json: str,
+    precal_witness_json: str,
+    stage_cache_dir: str,
+) -> dict:
+    from functools import partial
+
+    from lib import calculate_vk
+    from lib.cache import DiskLRUCache
+    from lib.timing import run_timed
+
+    stage_cache = DiskLRUCache(stage_cache_dir, STAGE_CACHE_MAX_BYTES)
+    tmp_dir = tempfile.mkdtemp()
+    start = time.perf_counter()
+    try:
+        _, durations = run_timed(
+            partial(calculate_vk, stage_cache=stage_cache),
+            tmp_dir, data_shape_json, computation, settings_json, precal_witness_json,
+        )
+        return {"latency": time.perf_counter() - start, "stages": durations, **worker_usage()}
+    except Exception as e:
+        return {"error": str(e), **worker_usage()}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def lib_verify_proof(
+    proof_json: str,
+    settings_json: str,
+    vk_b64: str,
+    selected_columns: list[str],
+    data_commitment_json: str,
+) -> dict:
+    from lib import verify_proof
+    from lib.timing import run_timed
+
+    tmp_dir = tempfile.mkdtemp()
+    start = time.perf_counter()
+    try:
+        _, durations = run_timed(verify_proof, tmp_dir, proof_json, settings_json, vk_b64, selected_columns, data_commitment_json)
+        return {"latency": time.perf_counter() - start, "stages": durations, **worker_usage()}
+    except Exception as e:
+        return {"error": str(e), **worker_usage()}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def worker_usage() -> dict[str, int]:
+    # ru_maxrss is in KiB on Linux
+    return {"pid": os.getpid(), "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+
+def run_lib(fn, tasks: list, concurrency: int) -> dict:
+    # A fresh pool per configuration, so that peak RSS and warm state do not carry over
+    with ProcessPoolExecutor(concurrency, mp_context=multiprocessing.get_context("spawn")) as pool:
+        list(pool.map(lib_warm_up, [1.0] * concurrency))
+        runs, wall_time = run_concurrently(lambda *args: pool.submit(fn, *args).result(), tasks, concurrency)
+    # Workers run side by side, so their peaks add up
+    peak_rss_by_worker = {}
+    for run in runs:
+        peak_rss_by_worker[run["pid"]] = max(run["peak_rss"], peak_rss_by_worker.get(run["pid"], 0))
+    return summarize_runs(runs, wall_time, sum(peak_rss_by_worker.values()))
+
+
+# ### `http` target
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(concurrency: int, cache_dir: str) -> tuple[subprocess.Popen, str]:
+    import requests
+
+    port = free_port()
+    env = {
+        **os.environ,
+        "ZKSTATS_CACHE_DIR": cache_dir,
+        "ZKSTATS_VK_WORKERS": str(concurrency),
+        "ZKSTATS_VK_MAX_QUEUE": str(concurrency),
+        "ZKSTATS_VERIFY_WORKERS": str(concurrency),
+        "ZKSTATS_VERIFY_MAX_QUEUE": str(concurrency),
+        "ZKSTATS_VERIFY_CACHE_SIZE": "0",
+        "ZKSTATS_SERVER_TIMING": "1",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=root_dir,
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            requests.get(f"{url}/stats", timeout=1).raise_for_status()
+            return server, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"Server did not start within {SERVER_START_TIMEOUT}s")
+
+
+def process_tree_peak_rss(pid: int) -> int | None:
+    # Sum of the peak RSS (VmHWM) of a process and its descendants. Linux only.
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            peak_rss = next(int(line.split()[1]) * 1024 for line in status_file if line.startswith("VmHWM:"))
+        with open(f"/proc/{pid}/task/{pid}/children") as children_file:
+            children = [int(child) for child in children_file.read().split()]
+    except (OSError, StopIteration):
+        return None
+    return peak_rss + sum(process_tree_peak_rss(child) or 0 for child in children)
+
+
+def parse_server_timing(header: str | None) -> dict[str, float]:
+    stages = {}
+    for metric in (header or "").split(","):
+        name, *params = [part.strip() for part in metric.split(";")]
+        for param in params:
+            if param.startswith("dur="):
+                stages[name] = float(param[len("dur="):]) / 1000
+    return stages
+
+
+def http_post(url: str, body: dict) -> dict:
+    import requests
+
+    start = time.perf_counter()
+    try:
+        response = requests.post(url, json=body)
+    except requests.RequestException as e:
+        return {"error": str(e)}
+    latency = time.perf_counter() - start
+    if response.status_code != 200:
+        return {"error": f"{response.status_code}: {response.text[:200]}"}
+    return {"latency": latency, "stages": parse_server_timing(response.headers.get("Server-Timing"))}
+
+
+def run_http(path: str, tasks: list[dict], concurrency: int, url: str | None) -> dict:
+    if url is not None:
+        # An external server: its memory use is unknown
+        runs, wall_time = run_concurrently(lambda body: http_post(f"{url}{path}", body), [(t,) for t in tasks], concurrency)
+        return summarize_runs(runs, wall_time, None)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server, server_url = start_server(concurrency, cache_dir)
+        try:
+            runs, wall_time = run_concurrently(
+                lambda body: http_post(f"{server_url}{path}", body),
+                [(t,) for t in tasks],
+                concurrency,
+            )
+            peak_rss = process_tree_peak_rss(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+    return summarize_runs(runs, wall_time, peak_rss)
+
+
+# ### Sweeps
+
+def vk_tasks(size: int, complexity: int, count: int, settings_json: str, run_offset: int) -> list[tuple]:
+    data_shape_json = json.dumps({column: size for column in COLUMNS})
+    tasks = []
+    for i in range(count):
+        computation, precal_witness_json = make_computation(complexity, run_offset + i)
+        tasks.append((data_shape_json, computation, settings_json, precal_witness_json))
+    return tasks
+
+
+def fixture_vk(settings_json: str) -> tuple[str, list[str]]:
+    # Generate the key the proof fixture verifies against
+    from lib import calculate_vk
+
+    computation, precal_witness_json = make_computation(len(FIXTURE_PRECAL_WITNESS), 0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        selected_columns, vk_path = calculate_vk(
+            tmp_dir, json.dumps(FIXTURE_DATA_SHAPE), computation, settings_json, precal_witness_json
+        )
+        with open(vk_path, "rb") as vk_file:
+            return base64.b64encode(vk_file.read()).decode("utf-8"), selected_columns
+
+
+def run_suite(args) -> list[dict]:
+    settings_json = make_settings(args.logrows)
+    results = []
+    # Distinct witness values across the whole run, so no configuration hits another's cache entries
+    run_offset = 0
+
+    for target in args.targets:
+        for size in args.shapes:
+            for complexity in args.complexity:
+                for concurrency in args.concurrency:
+                    config = {
+                        "target": target,
+                        "operation": "computation_to_vk",
+                        "data_shape": size,
+                        "complexity": complexity,
+                        "concurrency": concurrency,
+                    }
+                    print(f"Running {json.dumps(config)}", file=sys.stderr)
+                    tasks = vk_tasks(size, complexity, args.requests, settings_json, run_offset)
+                    run_offset += len(tasks)
+                    if target == "lib":
+                        # An empty stage cache per configuration, as the server gets
+                        with tempfile.TemporaryDirectory() as stage_cache_dir:
+                            tasks = [(*task, stage_cache_dir) for task in tasks]
+                            summary = run_lib(lib_calculate_vk, tasks, concurrency)
+                    else:
+                        bodies = [
+                            {"data_shape": shape, "computation": c, "settings": s, "precal_witness": w}
+                            for shape, c, s, w in tasks
+                        ]
+                        summary = run_http("/computation_to_vk", bodies, concurrency, args.url)
+                    results.append({**config, **summary})
+
+    if args.verify_requests:
+        # The fixture proof was generated with the fixture settings
+        fixture_settings_json = read_asset("settings.json")
+        vk_b64, selected_columns = fixture_vk(fixture_settings_json)
+        proof_json = read_asset("model.pf")
+        data_commitment_json = read_asset("data_commitment.json")
+        for target in args.targets:
+            for concurrency in args.concurrency:
+                config = {"target": target, "operation": "verify_proof", "concurrency": concurrency}
+                print(f"Running {json.dumps(config)}", file=sys.stderr)
+                if target == "lib":
+                    task = (proof_json, fixture_settings_json, vk_b64, selected_columns, data_commitment_json)
+                    summary = run_lib(lib_verify_proof, [task] * args.verify_requests, concurrency)
+                else:
+                    body = {
+                        "proof_json": proof_json,
+                        "settings_json": fixture_settings_json,
+                        "vk_b64": vk_b64,
+                        "selected_columns": selected_columns,
+                        "data_commitment_json": data_commitment_json,
+                    }
+                    summary = run_http("/verify_proof", [body] * args.verify_requests, concurrency, args.url)
+                results.append({**config, **summary})
+    return results
+
+
+def package_versions() -> dict[str, str | None]:
+    versions = {}
+    for package in ("zkstats", "ezkl", "torch", "fastapi", "uvicorn"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--targets", type=lambda v: v.split(","), default=list(TARGETS), help="Comma-separated, of: lib, http")
+    parser.add_argument("--shapes", type=int_list, default=[7, 64], help="Rows per column")
+    parser.add_argument("--complexity", type=int_list, default=[1, 2, 4], help="Statistics per computation")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 4])
+    parser.add_argument("--requests", type=int, default=4, help="Key generations per configuration")
+    parser.add_argument("--verify-requests", type=int, default=32, help="Verifications per configuration, 0 to skip")
+    parser.add_argument("--logrows", type=int, help="Override `logrows` of the settings, for larger shapes")
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one per configuration")
+    parser.add_argument("--output", help="Write the results to this file instead of stdout")
+    args = parser.parse_args()
+    unknown_targets = set(args.targets) - set(TARGETS)
+    if unknown_targets:
+        parser.error(f"Unknown targets: {', '.join(sorted(unknown_targets))}")
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": package_versions(),
+        "args": vars(args),
+        "results": run_suite(args),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,104 +1,168 @@
 import json
 import ast
-import importlib.util
+import asyncio
+import inspect
+import linecache
 import os
 import sys
-import torch
+import tempfile
+import threading
+import types
 import base64
+from collections import OrderedDict
+from typing import TYPE_CHECKING
 
-from zkstats.core import create_dummy, verifier_define_calculation, setup, verifier_verify
-from zkstats.computation import computation_to_model, State, Args, TComputation
+from .artifacts import ArtifactStore
+from .cache import DiskLRUCache, cached_file, content_hash, normalize_json
+from .srs import SRSStore, srs_logrows
+from .timing import Timings
+from .uploads import UploadedFile, payload_key, write_payload
 
+if TYPE_CHECKING:
+    from zkstats.computation import TComputation
 
+# The proving stack takes seconds and hundreds of MB to import. It is imported by the functions
+# that use it, so that processes which only hash and validate requests never load it.
+PROVING_MODULES = ('torch', 'ezkl', 'zkstats.core', 'zkstats.computation')
 
-class ExtractComputationFailure(Exception):
-    pass
-
-
-
-def extract_safe_computation(computation_str: str, module_path: str) -> TComputation:
 
-    # Define allowed AST node types
-    ALLOWED_NODES = (
-        ast.Module, ast.FunctionDef, ast.arguments, ast.arg, ast.Load, ast.Store,
-        ast.Name, ast.Sub, ast.Subscript, ast.Index, ast.Slice, ast.ExtSlice, ast.Call, ast.Expr, ast.Assign,
-        ast.BinOp, ast.UnaryOp, ast.Return, ast.Num, ast.Constant,
-        ast.Attribute, ast.Dict, ast.Tuple, ast.List, ast.Compare,
-        ast.If, ast.For, ast.While, ast.With, ast.Pass, ast.Str,
-        ast.BoolOp, ast.IfExp, ast.Lambda,
-    )
+class ExtractComputationFailure(ValueError):
+    pass
 
-    # Define allowed function names and methods
-    ALLOWED_FUNCTIONS = {
-        'state': None,  # Allow all methods on state
-        'args': None,   # Allow access to args
-        'torch': None,  # Allow any torch functions
-    }
-
-    class SafeNodeVisitor(ast.NodeVisitor):
-        def visit(self, node):
-            if isinstance(node, (ast.Import, ast.ImportFrom)):
-                raise ValueError("Import statements are not allowed.")
-            if not isinstance(node, ALLOWED_NODES):
-                raise ValueError(f"Disallowed node type: {type(node).__name__}")
-            self.generic_visit(node)
-
-        def visit_Subscript(self, node):
-            # Allow subscripts only on allowed objects
-            value_name = self.get_full_name(node.value)
-            if value_name.split('.')[0] not in ALLOWED_FUNCTIONS:
-                raise ValueError(f"Subscript access is not allowed on '{value_name}'")
-            self.generic_visit(node)
-
-        def visit_Call(self, node):
-            # Check function calls
-            if isinstance(node.func, ast.Name) and node.func.id in ['eval', 'exec']:
-                raise ValueError(f"Use of {node.func.id}() is not allowed.")
-            if isinstance(node.func, ast.Attribute):
-                # Method calls like obj.method()
-                obj = self.get_full_name(node.func.value)
-                func = node.func.attr
-                if obj.split('.')[0] in ALLOWED_FUNCTIONS:
-                    pass
-                else:
-                    raise ValueError(f"Disallowed function call: '{func}' on '{obj}'")
-            elif isinstance(node.func, ast.Name):
-                # Function calls like func()
-                func_name = node.func.id
-                if func_name in ALLOWED_FUNCTIONS and ALLOWED_FUNCTIONS[func_name] is None:
-                    pass
-                else:
-                    raise ValueError(f"Disallowed function call: '{func_name}'")
-            else:
-                raise ValueError(f"Disallowed function call: {ast.dump(node)}")
-            self.generic_visit(node)
 
-        def visit_Attribute(self, node):
-            # Allow attributes of allowed objects
-            obj = self.get_full_name(node.value)
-            attr = node.attr
+# Define allowed AST node types
+ALLOWED_NODES = (
+    ast.Module, ast.FunctionDef, ast.arguments, ast.arg, ast.Load, ast.Store,
+    ast.Name, ast.Sub, ast.Subscript, ast.Index, ast.Slice, ast.ExtSlice, ast.Call, ast.Expr, ast.Assign,
+    ast.BinOp, ast.UnaryOp, ast.Return, ast.Num, ast.Constant,
+    ast.Attribute, ast.Dict, ast.Tuple, ast.List, ast.Compare,
+    ast.If, ast.For, ast.While, ast.With, ast.Pass, ast.Str,
+    ast.BoolOp, ast.IfExp, ast.Lambda,
+)
+
+# Define allowed function names and methods
+ALLOWED_FUNCTIONS = {
+    'state': None,  # Allow all methods on state
+    'args': None,   # Allow access to args
+    'torch': None,  # Allow any torch functions
+}
+
+# Define a restricted set of built-in functions
+SAFE_BUILTINS = {
+    'abs': abs,
+    'all': all,
+    'any': any,
+    'bool': bool,
+    'callable': callable,
+    'chr': chr,
+    'complex': complex,
+    'dict': dict,
+    'enumerate': enumerate,
+    'float': float,
+    'int': int,
+    'len': len,
+    'list': list,
+    'max': max,
+    'min': min,
+    'pow': pow,
+    'range': range,
+    'set': set,
+    'str': str,
+    'sum': sum,
+    'tuple': tuple,
+    'zip': zip,
+    'sorted': sorted,
+    'reversed': reversed,
+    'slice': slice,
+    # '__import__': __import__,  # Necessary for module imports
+}
+
+
+class SafeNodeVisitor(ast.NodeVisitor):
+    def visit(self, node):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            raise ExtractComputationFailure("Import statements are not allowed.")
+        if not isinstance(node, ALLOWED_NODES):
+            raise ExtractComputationFailure(f"Disallowed node type: {type(node).__name__}")
+        self.generic_visit(node)
+
+    def visit_Subscript(self, node):
+        # Allow subscripts only on allowed objects
+        value_name = self.get_full_name(node.value)
+        if value_name.split('.')[0] not in ALLOWED_FUNCTIONS:
+            raise ExtractComputationFailure(f"Subscript access is not allowed on '{value_name}'")
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        # Check function calls
+        if isinstance(node.func, ast.Name) and node.func.id in ['eval', 'exec']:
+            raise ExtractComputationFailure(f"Use of {node.func.id}() is not allowed.")
+        if isinstance(node.func, ast.Attribute):
+            # Method calls like obj.method()
+            obj = self.get_full_name(node.func.value)
+            func = node.func.attr
             if obj.split('.')[0] in ALLOWED_FUNCTIONS:
                 pass
             else:
-                raise ValueError(f"Disallowed attribute access: '{attr}' on '{obj}'")
-            self.generic_visit(node)
-
-        def get_full_name(self, node):
-            if isinstance(node, ast.Name):
-                return node.id
-            elif isinstance(node, ast.Attribute):
-                return f"{self.get_full_name(node.value)}.{node.attr}"
-            elif isinstance(node, ast.Subscript):
-                return f"{self.get_full_name(node.value)}[{self.get_full_name(node.slice)}]"
-            elif isinstance(node, ast.Index):
-                return self.get_full_name(node.value)
-            elif isinstance(node, ast.Constant):
-                return str(node.value)
-            elif isinstance(node, ast.Str):  # For Python versions where strings are ast.Str
-                return node.s
+                raise ExtractComputationFailure(f"Disallowed function call: '{func}' on '{obj}'")
+        elif isinstance(node.func, ast.Name):
+            # Function calls like func()
+            func_name = node.func.id
+            if func_name in ALLOWED_FUNCTIONS and ALLOWED_FUNCTIONS[func_name] is None:
+                pass
             else:
-                return ""
-
+                raise ExtractComputationFailure(f"Disallowed function call: '{func_name}'")
+        else:
+            raise ExtractComputationFailure(f"Disallowed function call: {ast.dump(node)}")
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node):
+        # Allow attributes of allowed objects
+        obj = self.get_full_name(node.value)
+        attr = node.attr
+        if obj.split('.')[0] in ALLOWED_FUNCTIONS:
+            pass
+        else:
+            raise ExtractComputationFailure(f"Disallowed attribute access: '{attr}' on '{obj}'")
+        self.generic_visit(node)
+
+    def get_full_name(self, node):
+        if isinstance(node, ast.Name):
+            return node.id
+        elif isinstance(node, ast.Attribute):
+            return f"{self.get_full_name(node.value)}.{node.attr}"
+        elif isinstance(node, ast.Subscript):
+            return f"{self.get_full_name(node.value)}[{self.get_full_name(node.slice)}]"
+        elif isinstance(node, ast.Index):
+            return self.get_full_name(node.value)
+        elif isinstance(node, ast.Constant):
+            return str(node.value)
+        elif isinstance(node, ast.Str):  # For Python versions where strings are ast.Str
+            return node.s
+        else:
+            return ""
+
+
+# Extracted computations, keyed by the hash of their source, in least recently used order
+COMPUTATION_CACHE_SIZE = int(os.environ.get('ZKSTATS_COMPUTATION_CACHE_SIZE', 128))
+_computation_cache: OrderedDict[str, 'TComputation'] = OrderedDict()
+_computation_cache_lock = threading.Lock()
+
+
+def extract_safe_computation(computation_str: str) -> 'TComputation':
+    import torch
+    from zkstats.computation import State, Args
+
+    key = content_hash(computation_str)
+    with _computation_cache_lock:
+        computation_func = _computation_cache.get(key)
+        if computation_func is not None:
+            _computation_cache.move_to_end(key)
+            return computation_func
+
+    # Every computation gets its own module, so concurrent requests never replace each other's
+    module_name = f"computation_module_{key[:16]}"
+    filename = f"<{module_name}>"
     try:
         # Parse the computation_str into an AST
         parsed_ast = ast.parse(computation_str)
@@ -107,74 +171,22 @@ def extract_safe_computation(computation_str: str, module_path: str) -> TComputa
         visitor = SafeNodeVisitor()
         visitor.visit(parsed_ast)
 
-        # Write the computation_str to the module file
-        with open(module_path, 'w') as f:
-            f.write(computation_str)
-
-        # Import the module from the module file
-        module_name = os.path.splitext(os.path.basename(module_path))[0]
-        spec = importlib.util.spec_from_file_location(module_name, module_path)
-        computation_module = importlib.util.module_from_spec(spec)
-        # Ensure that the module has the correct __file__ attribute
-        computation_module.__file__ = module_path
-        sys.modules[module_name] = computation_module  # Add to sys.modules
-
-        # Use a custom loader to limit built-ins
-        class SafeLoader(spec.loader.__class__):
-            def exec_module(self, module):
-                # Compile the code with the correct filename
-                with open(module_path, 'r') as f:
-                    code = f.read()
-                code_object = compile(code, filename=module_path, mode='exec')
-
-                # Define a restricted set of built-in functions
-                safe_builtins = {
-                    'abs': abs,
-                    'all': all,
-                    'any': any,
-                    'bool': bool,
-                    'callable': callable,
-                    'chr': chr,
-                    'complex': complex,
-                    'dict': dict,
-                    'enumerate': enumerate,
-                    'float': float,
-                    'int': int,
-                    'len': len,
-                    'list': list,
-                    'max': max,
-                    'min': min,
-                    'pow': pow,
-                    'range': range,
-                    'set': set,
-                    'str': str,
-                    'sum': sum,
-                    'tuple': tuple,
-                    'zip': zip,
-                    'sorted': sorted,
-                    'reversed': reversed,
-                    'slice': slice,
-                    # '__import__': __import__,  # Necessary for module imports
-                }
-
-                # Define a restricted global namespace
-                restricted_globals = {
-                    '__builtins__': safe_builtins,
-                    '__name__': module.__name__,
-                    '__file__': module.__file__,
-                    'torch': torch,
-                    'State': State,
-                    'Args': Args,
-                }
-
-                # Execute the code in the restricted namespace
-                exec(code_object, restricted_globals, module.__dict__)
-
-        # Replace the loader with our SafeLoader
-        spec.loader = SafeLoader(spec.loader.name, spec.loader.path)
-
-        # Execute the module
-        spec.loader.exec_module(computation_module)
+        code_object = compile(parsed_ast, filename=filename, mode='exec')
+        computation_module = types.ModuleType(module_name)
+        computation_module.__file__ = filename
+
+        # Define a restricted global namespace
+        restricted_globals = {
+            '__builtins__': SAFE_BUILTINS,
+            '__name__': module_name,
+            '__file__': filename,
+            'torch': torch,
+            'State': State,
+            'Args': Args,
+        }
+
+        # Execute the code in the restricted namespace
+        exec(code_object, restricted_globals, computation_module.__dict__)
 
         # Get the computation function from the module
         computation_func = computation_module.computation
@@ -182,66 +194,262 @@ def extract_safe_computation(computation_str: str, module_path: str) -> TComputa
         # Ensure the function has the correct __module__ attribute
         computation_func.__module__ = module_name
 
-        return computation_func
-
     except Exception as e:
         print(f"Error while extracting computation: {e}")
         print(f"Computation: {computation_str!r}")
         raise e
 
+    # Make the source available to `inspect` without writing it to a file
+    linecache.cache[filename] = (len(computation_str), None, computation_str.splitlines(True), filename)
+    with _computation_cache_lock:
+        sys.modules[module_name] = computation_module
+        _computation_cache[key] = computation_func
+        while len(_computation_cache) > COMPUTATION_CACHE_SIZE:
+            _, evicted = _computation_cache.popitem(last=False)
+            sys.modules.pop(evicted.__module__, None)
+            linecache.cache.pop(f"<{evicted.__module__}>", None)
+    return computation_func
+
+
+def compile_circuit(model_path: str, compiled_model_path: str, settings_path: str):
+    import ezkl
+
+    res = ezkl.compile_circuit(model_path, compiled_model_path, settings_path)
+    assert res == True
+
+
+def setup_vk(
+    compiled_model_path: str,
+    settings_path: str,
+    vk_path: str,
+    pk_path: str | None = None,
+    srs_path: str | None = None,
+):
+    """
+    Like `zkstats.core.setup` for an already compiled circuit, but only writes the proving key if
+    `pk_path` is given.
+
+    ezkl has no VK-only setup, so the proving key is still computed. When it is not wanted it is
+    written to the null device instead of a file, which saves writing and deleting a file that is
+    usually much larger than the verification key.
+
+    With `srs_path`, the SRS is read from there, otherwise ezkl fetches it for the settings first.
+    """
+    import ezkl
+
+    if srs_path is None:
+        res = ezkl.get_srs(settings_path)
+        if inspect.isawaitable(res):
+            # Newer ezkl versions fetch the SRS asynchronously
+            res = asyncio.run(res)
+    res = ezkl.setup(
+        compiled_model_path,
+        vk_path,
+        pk_path if pk_path is not None else os.devnull,
+        srs_path=srs_path,
+    )
+    assert res == True
+    assert os.path.isfile(vk_path)
+
 
 def calculate_vk(
     tmp_dir: str,
     data_shape_json: str,
     computation_str: str,
     settings_json: str,
-    precal_witness_json: str,
+    precal_witness_json: str | UploadedFile,
+    pk_path: str | None = None,
+    stage_cache: DiskLRUCache | None = None,
+    srs_store: SRSStore | None = None,
+    artifact_store: ArtifactStore | None = None,
+    timings: Timings | None = None,
 ):
+    from zkstats.computation import computation_to_model
+    from zkstats.core import create_dummy, verifier_define_calculation
+
+    if timings is None:
+        timings = Timings()
     model_path = os.path.join(tmp_dir, 'model.onnx')
     compiled_model_path = os.path.join(tmp_dir, 'model.compiled')
     vk_path = os.path.join(tmp_dir, 'model.vk')
-    pk_path = os.path.join(tmp_dir, 'model.pk')
     dummy_data_path = os.path.join(tmp_dir, 'dummy_data.json')
     sel_dummy_data_path = os.path.join(tmp_dir, 'sel_dummy_data.json')
     precal_witness_path = os.path.join(tmp_dir, 'precal_witness.json')
     settings_path = os.path.join(tmp_dir, 'settings.json')
     data_shape = {k: int(v) for k, v in json.loads(data_shape_json).items()}
-    with open(precal_witness_path, 'w') as precal_witness_file:
-        precal_witness_file.write(precal_witness_json)
-    with open(settings_path, 'w') as settings_file:
-        settings_file.write(settings_json)
-    module_path = os.path.join(tmp_dir, 'computation_module.py')
-    c = extract_safe_computation(computation_str, module_path)
-    # Generate the verifier model with the `precal_witness_path` provided by the prover
-    selected_columns, _, verifier_model = computation_to_model(c, precal_witness_path, data_shape, isProver=False)
-    # Create dummy data with the same shape as the original data
-    create_dummy(data_shape, dummy_data_path)
-    # Generate the verifier model given the dummy data and the selected columns
-    verifier_define_calculation(dummy_data_path, selected_columns, sel_dummy_data_path, verifier_model, model_path)
-    # Generate the verification key
-    setup(model_path, compiled_model_path, settings_path, vk_path, pk_path)
+    data_shape_key = json.dumps(data_shape, sort_keys=True)
+    with timings.stage('staging'):
+        write_payload(precal_witness_json, precal_witness_path)
+        with open(settings_path, 'w') as settings_file:
+            settings_file.write(settings_json)
+
+    # Each stage is cached in `stage_cache` under the inputs it depends on, so only the stages
+    # whose inputs changed run again
+    def generate_dummy_data():
+        create_dummy(data_shape, dummy_data_path)
+        return {}
+
+    def generate_model():
+        with timings.stage('extract_computation'):
+            c = extract_safe_computation(computation_str)
+        with timings.stage('computation_to_model'):
+            # Generate the verifier model with the `precal_witness_path` provided by the prover
+            selected_columns, _, verifier_model = computation_to_model(c, precal_witness_path, data_shape, isProver=False)
+        with timings.stage('define_calculation'):
+            # Create dummy data with the same shape as the original data
+            cached_file(stage_cache, content_hash('dummy_data', data_shape_key), dummy_data_path, generate_dummy_data)
+            # Generate the verifier model given the dummy data and the selected columns
+            verifier_define_calculation(dummy_data_path, selected_columns, sel_dummy_data_path, verifier_model, model_path)
+        return {"selected_columns": selected_columns}
+
+    def generate_compiled_model():
+        compile_circuit(model_path, compiled_model_path, settings_path)
+        return {}
+
+    model_key = content_hash('model', computation_str, data_shape_key, payload_key(precal_witness_json, normalize=True))
+    selected_columns = cached_file(stage_cache, model_key, model_path, generate_model)["selected_columns"]
+
+    with timings.stage('compile'):
+        with open(model_path, 'rb') as model_file:
+            compiled_key = content_hash('compiled', model_file.read(), normalize_json(settings_json))
+        # Compiled circuits are also shared with other replicas, if there is an artifact store
+        cached_file(stage_cache, compiled_key, compiled_model_path, generate_compiled_model, artifact_store)
+    srs_path = None
+    if srs_store is not None:
+        with timings.stage('srs'):
+            logrows = srs_logrows(settings_json)
+            srs_path = srs_store.ensure(logrows) if logrows is not None else None
+    with timings.stage('setup'):
+        # Generate the verification key, and the proving key only if the caller asked for it
+        setup_vk(compiled_model_path, settings_path, vk_path, pk_path, srs_path)
     return selected_columns, vk_path
 
 
-def verify_proof(
-    tmp_dir: str,
-    proof_json: str,
+WARM_UP_COMPUTATION = """def computation(state: State, args: Args):
+    return state.mean(args["x"])
+"""
+
+
+def warm_up():
+    """
+    Run a tiny computation through key generation up to compiling its circuit, so that a worker
+    process has imported the proving stack and initialized torch and ezkl before its first request.
+    The setup is skipped since it needs an SRS.
+    """
+    import ezkl
+    from zkstats.computation import computation_to_model
+    from zkstats.core import create_dummy, verifier_define_calculation
+
+    data_shape = {'x': 4}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        precal_witness_path = os.path.join(tmp_dir, 'precal_witness.json')
+        dummy_data_path = os.path.join(tmp_dir, 'dummy_data.json')
+        sel_dummy_data_path = os.path.join(tmp_dir, 'sel_dummy_data.json')
+        model_path = os.path.join(tmp_dir, 'model.onnx')
+        settings_path = os.path.join(tmp_dir, 'settings.json')
+        with open(precal_witness_path, 'w') as precal_witness_file:
+            json.dump({'Mean_0': [0.0]}, precal_witness_file)
+        c = extract_safe_computation(WARM_UP_COMPUTATION)
+        selected_columns, _, verifier_model = computation_to_model(c, precal_witness_path, data_shape, isProver=False)
+        create_dummy(data_shape, dummy_data_path)
+        verifier_define_calculation(dummy_data_path, selected_columns, sel_dummy_data_path, verifier_model, model_path)
+        res = ezkl.gen_settings(model_path, settings_path)
+        assert res == True
+        compile_circuit(model_path, os.path.join(tmp_dir, 'model.compiled'), settings_path)
+
+
+def calculate_vk_key(
+    data_shape_json: str,
+    computation_str: str,
     settings_json: str,
-    vk_b64: str,
+    precal_witness_json: str | UploadedFile,
+) -> str:
+    # Hash the normalized inputs of `calculate_vk` so equivalent requests share a key
+    data_shape = {k: int(v) for k, v in json.loads(data_shape_json).items()}
+    return content_hash(
+        json.dumps(data_shape, sort_keys=True),
+        computation_str,
+        normalize_json(settings_json),
+        payload_key(precal_witness_json, normalize=True),
+    )
+
+
+def verification_key_key(settings_json: str, vk_b64: str) -> str:
+    # Identifies a VK given inline. Hashes the encoded key to avoid decoding it.
+    return content_hash('vk_b64', vk_b64, normalize_json(settings_json))
+
+
+def verify_proof_key(
+    proof_json: str | UploadedFile,
+    vk_key: str,
     selected_columns: list[str],
     data_commitment_json: str,
-):
-    proof_path = os.path.join(tmp_dir, 'proof.json')
-    data_commitment_path = os.path.join(tmp_dir, 'data_commitment.json')
+) -> str:
+    # `vk_key` is either a registered `vk_id` or the result of `verification_key_key`
+    return content_hash(payload_key(proof_json), vk_key, json.dumps(selected_columns), data_commitment_json)
+
+
+def stage_verification_key(
+    tmp_dir: str,
+    settings_json: str,
+    vk_b64: str,
+) -> tuple[str, str]:
     settings_path = os.path.join(tmp_dir, 'settings.json')
     vk_path = os.path.join(tmp_dir, 'model.vk')
-    with open(proof_path, 'w') as proof_file:
-        proof_file.write(proof_json)
     with open(settings_path, 'w') as settings_file:
         settings_file.write(settings_json)
-    with open(data_commitment_path, 'w') as data_commitment_file:
-        data_commitment_file.write(data_commitment_json)
     with open(vk_path, 'wb') as vk_file:
         vk_file.write(base64.b64decode(vk_b64))
-    res = verifier_verify(proof_path, settings_path, vk_path, selected_columns, data_commitment_path)
-    return res
+    return settings_path, vk_path
+
+
+def verify_staged_proof(
+    work_dir: str,
+    proof_json: str | UploadedFile,
+    settings_path: str,
+    vk_path: str,
+    selected_columns: list[str],
+    data_commitment_json: str,
+    srs_store: SRSStore | None = None,
+    timings: Timings | None = None,
+):
+    from zkstats.core import verifier_verify
+
+    if timings is None:
+        timings = Timings()
+    # Settings and VK are already on disk, possibly shared with other proofs
+    proof_path = os.path.join(work_dir, 'proof.json')
+    data_commitment_path = os.path.join(work_dir, 'data_commitment.json')
+    with timings.stage('staging'):
+        write_payload(proof_json, proof_path)
+        with open(data_commitment_path, 'w') as data_commitment_file:
+            data_commitment_file.write(data_commitment_json)
+    if srs_store is not None:
+        # ezkl reads the SRS from `srs_store`'s directory, which may not have it yet if the key
+        # was generated elsewhere, e.g. by another replica
+        with timings.stage('srs'):
+            with open(settings_path, 'r') as settings_file:
+                logrows = srs_logrows(settings_file.read())
+            if logrows is not None:
+                srs_store.ensure(logrows)
+    with timings.stage('verify'):
+        return verifier_verify(proof_path, settings_path, vk_path, selected_columns, data_commitment_path)
+
+
+def verify_proof(
+    tmp_dir: str,
+    proof_json: str | UploadedFile,
+    settings_json: str,
+    vk_b64: str,
+    selected_columns: list[str],
+    data_commitment_json: str,
+    srs_store: SRSStore | None = None,
+    timings: Timings | None = None,
+):
+    if timings is None:
+        timings = Timings()
+    with timings.stage('staging'):
+        settings_path, vk_path = stage_verification_key(tmp_dir, settings_json, vk_b64)
+    return verify_staged_proof(
+        tmp_dir, proof_json, settings_path, vk_path, selected_columns, data_commitment_json, srs_store, timings
+    )
@@ -0,0 +1,186 @@
+import ast
+import asyncio
+import json
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Cost:
+    seconds: float
+    memory_bytes: int
+
+
+@dataclass(frozen=True)
+class CostModel:
+    """
+    Linear estimate of the time and peak memory of `lib.calculate_vk`.
+
+    The setup dominates for all but tiny circuits and scales with the number of circuit rows,
+    2**logrows. Building the model scales with the number of data cells times the size of the
+    computation. The defaults are rough, calibrate them with `benchmarks/suite.py`.
+    """
+    base_seconds: float = 1.0
+    seconds_per_row: float = 20e-6
+    seconds_per_cell_node: float = 1e-6
+    base_memory_bytes: int = 256 * 1024 * 1024
+    memory_bytes_per_row: int = 4096
+    memory_bytes_per_cell: int = 64
+
+    def estimate(self, data_shape_json: str, computation_str: str, settings_json: str) -> Cost:
+        # Raises ValueError for inputs that cannot be parsed
+        cells = sum(int(rows) for rows in json.loads(data_shape_json).values())
+        try:
+            ast_nodes = sum(1 for _ in ast.walk(ast.parse(computation_str)))
+        except SyntaxError as e:
+            raise ValueError(f"Invalid computation: {e}")
+        circuit_rows = 2 ** int(json.loads(settings_json)['run_args']['logrows'])
+        return Cost(
+            seconds=(
+                self.base_seconds
+                + self.seconds_per_row * circuit_rows
+                + self.seconds_per_cell_node * cells * ast_nodes
+            ),
+            memory_bytes=(
+                self.base_memory_bytes
+                + self.memory_bytes_per_row * circuit_rows
+                + self.memory_bytes_per_cell * cells
+            ),
+        )
+
+
+class OverBudget(Exception):
+    def __init__(self, cost: Cost, max_cost: Cost):
+        super().__init__(
+            f"Estimated cost of {cost.seconds:.0f}s and {cost.memory_bytes / 2**20:.0f} MiB exceeds the limit of "
+            f"{max_cost.seconds:.0f}s and {max_cost.memory_bytes / 2**20:.0f} MiB per request"
+        )
+        self.cost = cost
+
+
+class AdmissionQueueFull(Exception):
+    def __init__(self, queue_name: str, retry_after: int):
+        super().__init__(f"Admission queue '{queue_name}' is full, retry after {retry_after}s")
+        self.queue_name = queue_name
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admits tasks by their estimated cost, before they take a worker.
+
+    At most `max_running` tasks run at once, and their estimated memory adds up to at most
+    `memory_budget`. Tasks that do not fit wait in one of two queues, `light` for tasks estimated
+    to take at most `heavy_seconds` and `heavy` for the others, which are served in weighted
+    round-robin so that a backlog of heavy tasks delays light ones only by so much. At most
+    `max_queue` tasks wait in total. Tasks costing more than `max_cost` are never admitted.
+    """
+
+    def __init__(
+        self,
+        max_running: int,
+        max_queue: int,
+        memory_budget: int,
+        max_cost: Cost,
+        heavy_seconds: float,
+        weights: dict[str, int] | None = None,
+        retry_after: int = 5,
+    ):
+        self.max_running = max_running
+        self.max_queue = max_queue
+        self.memory_budget = memory_budget
+        self.max_cost = Cost(max_cost.seconds, min(max_cost.memory_bytes, memory_budget))
+        self.heavy_seconds = heavy_seconds
+        self.retry_after = retry_after
+        weights = weights or {"light": 2, "heavy": 1}
+        self._queues: dict[str, deque[tuple[Cost, asyncio.Future]]] = {name: deque() for name in weights}
+        # Each queue appears in the schedule as many times as its weight
+        self._schedule = [name for name, weight in weights.items() for _ in range(weight)]
+        self._turn = 0
+        self._running = 0
+        self._memory_in_use = 0
+        self.rejected = 0
+
+    def queue_for(self, cost: Cost) -> str:
+        return "heavy" if cost.seconds > self.heavy_seconds else "light"
+
+    def check(self, cost: Cost):
+        if cost.seconds > self.max_cost.seconds or cost.memory_bytes > self.max_cost.memory_bytes:
+            self.rejected += 1
+            raise OverBudget(cost, self.max_cost)
+
+    def _fits(self, cost: Cost) -> bool:
+        return self._running < self.max_running and self._memory_in_use + cost.memory_bytes <= self.memory_budget
+
+    def _take(self, cost: Cost):
+        self._running += 1
+        self._memory_in_use += cost.memory_bytes
+
+    @asynccontextmanager
+    async def admit(self, cost: Cost):
+        self.check(cost)
+        if self._fits(cost) and not any(self._queues.values()):
+            self._take(cost)
+        else:
+            queue_name = self.queue_for(cost)
+            if sum(len(queue) for queue in self._queues.values()) >= self.max_queue:
+                self.rejected += 1
+                raise AdmissionQueueFull(queue_name, self.retry_after)
+            waiter = asyncio.get_running_loop().create_future()
+            self._queues[queue_name].append((cost, waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Admitted just before being cancelled
+                    self._release(cost)
+                else:
+                    try:
+                        self._queues[queue_name].remove((cost, waiter))
+                    except ValueError:
+                        # Already dropped by `_dispatch`
+                        pass
+                    # It may have been holding up the tasks behind it
+                    self._dispatch()
+                raise
+        try:
+            yield
+        finally:
+            self._release(cost)
+
+    def _release(self, cost: Cost):
+        self._running -= 1
+        self._memory_in_use -= cost.memory_bytes
+        self._dispatch()
+
+    def _dispatch(self):
+        while any(self._queues.values()):
+            # The next non-empty queue in the schedule
+            for _ in range(len(self._schedule)):
+                queue = self._queues[self._schedule[self._turn]]
+                if queue:
+                    break
+                self._turn = (self._turn + 1) % len(self._schedule)
+            cost, waiter = queue[0]
+            if waiter.cancelled():
+                # Its task was cancelled but has not run its cleanup yet
+                queue.popleft()
+                continue
+            # Wait for more capacity rather than letting smaller tasks overtake, so that a large
+            # task is not starved
+            if not self._fits(cost):
+                return
+            queue.popleft()
+            self._turn = (self._turn + 1) % len(self._schedule)
+            self._take(cost)
+            waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "memory_in_use": self._memory_in_use,
+            "memory_budget": self.memory_budget,
+            "queued": {name: len(queue) for name, queue in self._queues.items()},
+            "rejected": self.rejected,
+        }
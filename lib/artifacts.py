@@ -0,0 +1,329 @@
+import abc
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from urllib.parse import urlparse
+
+from .cache import atomic_write
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore(abc.ABC):
+    """
+    Artifacts shared by the replicas of a deployment, keyed by the content hash of their inputs.
+
+    An artifact is a file and a JSON metadata dict. The file is written before its metadata, which
+    records its SHA-256 and marks it complete, so readers never see a partial artifact. `fetch`
+    verifies the file against the SHA-256, and treats and removes a corrupted artifact as missing.
+    Backends implement the storage methods below.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.corrupted = 0
+        self.published = 0
+
+    def fetch(self, key: str, path: str) -> dict | None:
+        # Write the artifact for `key` to `path` and return its metadata, or None if it is missing
+        record = self._get_record(key)
+        if record is None:
+            self.misses += 1
+            return None
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.tmp-')
+        os.close(fd)
+        try:
+            if not self._get_file(key, tmp_path) or _file_sha256(tmp_path) != record["sha256"]:
+                # Another replica may be replacing the artifact, or it was damaged. Either way
+                # remove it, so that the key is generated and published again.
+                self.corrupted += 1
+                self.misses += 1
+                self._delete(key)
+                os.unlink(tmp_path)
+                return None
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self.hits += 1
+        return record["meta"]
+
+    def publish(self, key: str, path: str, meta: dict):
+        record = {"sha256": _file_sha256(path), "size": os.path.getsize(path), "meta": meta}
+        self._put_file(key, path)
+        self._put_record(key, json.dumps(record).encode('utf-8'))
+        self.published += 1
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "corrupted": self.corrupted,
+            "published": self.published,
+        }
+
+    @abc.abstractmethod
+    def _get_record(self, key: str) -> dict | None:
+        ...
+
+    @abc.abstractmethod
+    def _put_record(self, key: str, data: bytes):
+        ...
+
+    @abc.abstractmethod
+    def _get_file(self, key: str, path: str) -> bool:
+        # Whether the file existed
+        ...
+
+    @abc.abstractmethod
+    def _put_file(self, key: str, path: str):
+        ...
+
+    @abc.abstractmethod
+    def _delete(self, key: str):
+        ...
+
+
+class FilesystemArtifactStore(ArtifactStore):
+    """
+    Artifacts in a directory, typically on a file system mounted by every replica such as NFS.
+
+    Files are renamed into place, which is atomic within one file system.
+    """
+
+    def __init__(self, root: str):
+        super().__init__()
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str, suffix: str) -> str:
+        # Spread entries over subdirectories, large directories are slow on network file systems
+        return os.path.join(self.root, key[:2], f"{key}{suffix}")
+
+    def _get_record(self, key: str) -> dict | None:
+        try:
+            with open(self._path(key, '.json'), 'r') as record_file:
+                return json.load(record_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _put_record(self, key: str, data: bytes):
+        atomic_write(self._path(key, '.json'), data)
+
+    def _get_file(self, key: str, path: str) -> bool:
+        try:
+            shutil.copyfile(self._path(key, '.bin'), path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _put_file(self, key: str, path: str):
+        blob_path = self._path(key, '.bin')
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), prefix='.tmp-')
+        os.close(fd)
+        try:
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, blob_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _delete(self, key: str):
+        # The record first, so that the artifact is never complete without its file
+        for suffix in ('.json', '.bin'):
+            try:
+                os.unlink(self._path(key, suffix))
+            except FileNotFoundError:
+                pass
+
+    def __reduce__(self):
+        # Worker processes get a store for the same directory, without the counters
+        return FilesystemArtifactStore, (self.root,)
+
+
+class LocalObjectClient:
+    """
+    Stand-in for an object store client, keeping objects in a local directory.
+
+    It has the subset of the S3 API that `ObjectArtifactStore` uses: whole objects are written and
+    read by name, and a written object becomes visible at once and completely.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, name))
+        if not path.startswith(os.path.join(os.path.normpath(self.root), '')):
+            raise ValueError(f"Invalid object name: {name}")
+        return path
+
+    def put_object(self, name: str, data: bytes):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, data)
+
+    def get_object(self, name: str) -> bytes | None:
+        try:
+            with open(self._path(name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def upload_file(self, path: str, name: str):
+        dst_path = self._path(name)
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dst_path), prefix='.tmp-')
+        os.close(fd)
+        try:
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, dst_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def download_file(self, name: str, path: str) -> bool:
+        try:
+            shutil.copyfile(self._path(name), path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def delete_object(self, name: str):
+        try:
+            os.unlink(self._path(name))
+        except FileNotFoundError:
+            pass
+
+
+class S3Client:
+    """
+    Object store client for S3 and compatible stores. Needs the `boto3` package.
+
+    Credentials and the region are read by boto3 from its usual environment variables and files.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: str | None = None):
+        import boto3  # noqa: F401
+
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # boto3 clients cannot be pickled, each process creates its own on first use
+        with self._lock:
+            if self._client is None:
+                import boto3
+
+                self._client = boto3.client('s3', endpoint_url=self.endpoint_url)
+            return self._client
+
+    def _is_missing(self, e: Exception) -> bool:
+        return getattr(e, 'response', {}).get('Error', {}).get('Code') in ('404', 'NoSuchKey')
+
+    def put_object(self, name: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=name, Body=data)
+
+    def get_object(self, name: str) -> bytes | None:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=name)['Body'].read()
+        except Exception as e:
+            if self._is_missing(e):
+                return None
+            raise
+
+    def upload_file(self, path: str, name: str):
+        self.client.upload_file(path, self.bucket, name)
+
+    def download_file(self, name: str, path: str) -> bool:
+        try:
+            self.client.download_file(self.bucket, name, path)
+        except Exception as e:
+            if self._is_missing(e):
+                return False
+            raise
+        return True
+
+    def delete_object(self, name: str):
+        self.client.delete_object(Bucket=self.bucket, Key=name)
+
+    def __reduce__(self):
+        return S3Client, (self.bucket, self.endpoint_url)
+
+
+class ObjectArtifactStore(ArtifactStore):
+    """
+    Artifacts in an object store, as objects named `<prefix><key>` and `<prefix><key>.json`.
+
+    `client` is an `S3Client`, or a `LocalObjectClient` to run without an object store. Object
+    stores write each object atomically, so only the order of the two writes matters.
+    """
+
+    def __init__(self, client, prefix: str = ''):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+
+    def _get_record(self, key: str) -> dict | None:
+        data = self.client.get_object(f"{self.prefix}{key}.json")
+        if data is None:
+            return None
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError:
+            return None
+
+    def _put_record(self, key: str, data: bytes):
+        self.client.put_object(f"{self.prefix}{key}.json", data)
+
+    def _get_file(self, key: str, path: str) -> bool:
+        return self.client.download_file(f"{self.prefix}{key}", path)
+
+    def _put_file(self, key: str, path: str):
+        self.client.upload_file(path, f"{self.prefix}{key}")
+
+    def _delete(self, key: str):
+        self.client.delete_object(f"{self.prefix}{key}.json")
+        self.client.delete_object(f"{self.prefix}{key}")
+
+    def __reduce__(self):
+        return ObjectArtifactStore, (self.client, self.prefix)
+
+
+def open_artifact_store(url: str) -> ArtifactStore | None:
+    # `file:///path` for a shared file system, `s3://bucket/prefix` for S3 (with the endpoint of
+    # a compatible store in `AWS_ENDPOINT_URL`), or `local-object:///path` for the local stand-in
+    # of an object store. An empty URL disables the store.
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme == 'file':
+        return FilesystemArtifactStore(parsed.path)
+    if parsed.scheme == 'local-object':
+        return ObjectArtifactStore(LocalObjectClient(parsed.path))
+    if parsed.scheme == 's3':
+        prefix = parsed.path.lstrip('/')
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+        return ObjectArtifactStore(S3Client(parsed.netloc, os.environ.get('AWS_ENDPOINT_URL')), prefix)
+    raise ValueError(f"Unsupported artifact store URL: {url}")
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .staging import link_or_copy
+
+
+def normalize_json(json_str: str) -> str:
+    # Re-serialize so whitespace and key order do not change the cache key
+    return json.dumps(json.loads(json_str), sort_keys=True, separators=(',', ':'))
+
+
+def content_hash(*parts: str | bytes) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") hash differently
+        h.update(len(part).to_bytes(8, 'big'))
+        h.update(part)
+    return h.hexdigest()
+
+
+class LRUCache:
+    """
+    In-memory cache holding at most `max_entries` values, evicting the least recently used.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, object] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def file_content_hash(path: str, *parts: str | bytes) -> str:
+    # Same as `content_hash(<contents of path>, *parts)`, without reading the file into memory
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        h.update(os.fstat(f.fileno()).st_size.to_bytes(8, 'big'))
+        while chunk := f.read(1024 * 1024):
+            h.update(chunk)
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        h.update(len(part).to_bytes(8, 'big'))
+        h.update(part)
+    return h.hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    path: str
+    meta: dict
+
+
+class DiskLRUCache:
+    """
+    Persistent content-addressed cache of blobs with JSON metadata.
+
+    Each entry is stored as `<key>.bin` plus `<key>.json` in `cache_dir`. Recency is tracked with
+    the blob's mtime, so the LRU order survives restarts. Once the total blob size exceeds
+    `max_bytes`, the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __reduce__(self):
+        # Rebuild from the directory when sent to a worker process. Counters are per process.
+        return (DiskLRUCache, (self.cache_dir, self.max_bytes))
+
+    def _blob_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str, count: bool = True) -> CacheEntry | None:
+        # With `count=False`, e.g. when checking again for a key whose miss was already counted,
+        # the hit and miss counters are left alone
+        blob_path = self._blob_path(key)
+        with self._lock:
+            try:
+                with open(self._meta_path(key), 'r') as meta_file:
+                    meta = json.load(meta_file)
+                # Mark as recently used
+                os.utime(blob_path)
+            except (FileNotFoundError, json.JSONDecodeError):
+                if count:
+                    self.misses += 1
+                return None
+            if count:
+                self.hits += 1
+        return CacheEntry(blob_path, meta)
+
+    def put(self, key: str, data: bytes, meta: dict) -> CacheEntry:
+        blob_path = self._blob_path(key)
+        with self._lock:
+            # Write the blob before the metadata, since `get` treats the metadata as the commit marker
+            atomic_write(blob_path, data)
+            atomic_write(self._meta_path(key), json.dumps(meta).encode('utf-8'))
+            self._evict()
+        return CacheEntry(blob_path, meta)
+
+    def put_file(self, key: str, src_path: str, meta: dict) -> CacheEntry:
+        blob_path = self._blob_path(key)
+        tmp_path = os.path.join(self.cache_dir, f".tmp-{os.getpid()}-{threading.get_ident()}-{key}")
+        with self._lock:
+            # Link the file into place instead of reading and rewriting it where possible
+            link_or_copy(src_path, tmp_path)
+            os.replace(tmp_path, blob_path)
+            atomic_write(self._meta_path(key), json.dumps(meta).encode('utf-8'))
+            self._evict()
+        return CacheEntry(blob_path, meta)
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.bin'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name[:-len('.bin')]))
+            total += st.st_size
+        entries.sort()
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            for path in (self._meta_path(key), self._blob_path(key)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def cached_file(cache: DiskLRUCache | None, key: str, path: str, produce, shared=None) -> dict:
+    # Make the artifact for `key` available at `path`, calling `produce` to write it there only
+    # on a cache miss. `produce` returns the metadata to store with the artifact. `shared`, an
+    # `lib.artifacts.ArtifactStore`, is checked after the local cache and gets what is produced.
+    if cache is not None:
+        entry = cache.get(key)
+        if entry is not None:
+            try:
+                link_or_copy(entry.path, path)
+                return entry.meta
+            except FileNotFoundError:
+                # Evicted in the meantime
+                pass
+    meta = None
+    if shared is not None:
+        try:
+            meta = shared.fetch(key, path)
+        except Exception as e:
+            # An unreachable store only costs producing the artifact
+            print(f"Error: fetching {key} from the artifact store failed: {e}")
+    if meta is None:
+        meta = produce()
+        if shared is not None:
+            try:
+                shared.publish(key, path, meta)
+            except Exception as e:
+                print(f"Error: publishing {key} to the artifact store failed: {e}")
+    if cache is not None:
+        cache.put_file(key, path, meta)
+    return meta
+
+
+def atomic_write(path: str, data: bytes):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
@@ -0,0 +1,116 @@
+import json
+import zlib
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_AVAILABLE = orjson is not None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _parse_header_list(header: str) -> list[tuple[str, float]]:
+    # Parse e.g. "application/json;q=0.5, */*" into [("application/json", 0.5), ("*/*", 1.0)]
+    items = []
+    for item in header.split(','):
+        value, *params = [p.strip() for p in item.split(';')]
+        if not value:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, param_value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(param_value)
+                except ValueError:
+                    q = 0.0
+        items.append((value.lower(), q))
+    return items
+
+
+def negotiate_media_type(accept: str | None, offered: list[str]) -> str | None:
+    """
+    Pick the media type from `offered` that the `Accept` header prefers, or None if it accepts
+    none of them. Ties, and a missing header, go to the earliest offered type.
+    """
+    if not accept:
+        return offered[0]
+    media_ranges = _parse_header_list(accept)
+    best, best_q = None, 0.0
+    for media_type in offered:
+        q = _media_type_q(media_type, media_ranges)
+        if q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+def _media_type_q(media_type: str, media_ranges: list[tuple[str, float]]) -> float:
+    # The most specific matching media range determines the q value
+    specificity, q = -1, 0.0
+    for media_range, range_q in media_ranges:
+        if media_range == media_type:
+            range_specificity = 2
+        elif media_range.endswith('/*') and media_type.startswith(media_range[:-1]):
+            range_specificity = 1
+        elif media_range in ('*/*', '*'):
+            range_specificity = 0
+        else:
+            continue
+        if range_specificity > specificity:
+            specificity, q = range_specificity, range_q
+    return q
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    # Prefer zstd when the optional `zstandard` package is installed, then gzip
+    if not accept_encoding:
+        return None
+    accepted = {encoding: q for encoding, q in _parse_header_list(accept_encoding) if q > 0}
+    if zstandard is not None and 'zstd' in accepted:
+        return 'zstd'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def dumps_json(content, use_orjson: bool = False) -> bytes:
+    # Same output as Starlette's `JSONResponse` or, with `use_orjson`, `ORJSONResponse`
+    if use_orjson:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+
+def compress_chunks(chunks, encoding: str | None):
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor().compressobj()
+    elif encoding == 'gzip':
+        compressor = zlib.compressobj(wbits=31)
+    else:
+        raise ValueError(f"Unsupported encoding: {encoding}")
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def compress(data: bytes, encoding: str | None) -> bytes:
+    return b''.join(compress_chunks([data], encoding))
+
+
+def read_chunks(file):
+    # Yield the rest of `file` in chunks and close it
+    with file:
+        while chunk := file.read(CHUNK_SIZE):
+            yield chunk
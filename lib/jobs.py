@@ -0,0 +1,84 @@
+import json
+import os
+import re
+
+from .cache import atomic_write
+
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class JobStore:
+    """
+    State of background jobs, persisted as `<jobs_dir>/<job_id>.json` so that it survives restarts.
+
+    While a job runs, the worker writes the stage it is in to `<jobs_dir>/<job_id>.stage`.
+    """
+
+    def __init__(self, jobs_dir: str):
+        self.jobs_dir = jobs_dir
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def progress_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.stage")
+
+    def save(self, job_id: str, state: dict):
+        atomic_write(self._state_path(job_id), json.dumps(state).encode('utf-8'))
+
+    def load(self, job_id: str) -> dict | None:
+        # Reject anything that is not a hash before using it in a path
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(self._state_path(job_id), 'r') as state_file:
+                return json.load(state_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def read_progress(self, job_id: str) -> str | None:
+        try:
+            with open(self.progress_path(job_id), 'r') as progress_file:
+                return progress_file.read() or None
+        except FileNotFoundError:
+            return None
+
+    def clear_progress(self, job_id: str):
+        try:
+            os.remove(self.progress_path(job_id))
+        except FileNotFoundError:
+            pass
+
+
+def process_start_time(pid: int) -> str | None:
+    # Identifies a process together with its PID, which is reused by later processes, e.g. by a
+    # restarted server in a container, where it is always 1. Linux only, None elsewhere.
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as stat_file:
+            stat = stat_file.read()
+        with open("/proc/sys/kernel/random/boot_id", 'r') as boot_id_file:
+            boot_id = boot_id_file.read().strip()
+    except OSError:
+        return None
+    # The command name may contain spaces and parentheses, the fields after it do not. The start
+    # time, in clock ticks since boot, is the 22nd field.
+    fields = stat[stat.rindex(')') + 2:].split()
+    return f"{boot_id}-{fields[19]}"
+
+
+def process_owner() -> dict:
+    # Saved with the state of a job, for `process_alive` to tell whether its process still runs
+    return {"pid": os.getpid(), "started": process_start_time(os.getpid())}
+
+
+def process_alive(pid: int, started: str | None = None) -> bool:
+    # With `started`, as saved by `process_owner`, a different process with the same PID is dead
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return started is None or process_start_time(pid) == started
@@ -0,0 +1,72 @@
+import threading
+
+
+# Bucket upper bounds in seconds, from cache hits to multi-minute key generations
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Histogram:
+    """
+    Prometheus histogram, rendered in the text exposition format by `render`.
+    """
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # Cumulative bucket counts and sum of observations, per label values
+        self._bucket_counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            bucket_counts = self._bucket_counts.setdefault(key, [0] * len(self.buckets))
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    bucket_counts[i] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, bucket_counts in sorted(self._bucket_counts.items()):
+                labels = dict(zip(self.label_names, key))
+                for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                    bucket_labels = _format_labels({**labels, "le": _format_value(upper_bound)})
+                    lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(self._sums[key])}")
+                # The +Inf bucket counts every observation
+                lines.append(f"{self.name}_count{_format_labels(labels)} {bucket_counts[-1]}")
+        return lines
+
+
+def render_samples(
+    name: str,
+    metric_type: str,
+    documentation: str,
+    samples: list[tuple[dict[str, str], float]],
+) -> list[str]:
+    # Render a gauge or counter whose values are read at scrape time
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return lines
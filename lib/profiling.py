@@ -0,0 +1,211 @@
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from .cache import atomic_write
+from .timing import Timings, progress_writer
+
+# Profile of the time spent outside of any stage
+OTHER_STAGE = 'other'
+# Nanoseconds since the epoch, zero-padded so that IDs sort by creation time, and a random suffix
+# that keeps IDs of different processes apart
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{20}-[0-9a-f]{8}$')
+
+_last_ns = 0
+_last_ns_lock = threading.Lock()
+
+
+def _profile_id() -> str:
+    # Strictly increasing within the process, even for profiles saved within the clock's resolution
+    global _last_ns
+    with _last_ns_lock:
+        _last_ns = max(time.time_ns(), _last_ns + 1)
+        return f"{_last_ns:020d}-{uuid.uuid4().hex[:8]}"
+
+
+class ProfiledTimings(Timings):
+    """
+    `Timings` that also profile each stage with cProfile, so that profiles carry the same stage
+    names as the durations. Within `profile`, time outside of any stage is profiled as `other`.
+    """
+
+    def __init__(self, on_stage=None):
+        super().__init__(on_stage)
+        self.profiles: dict[str, cProfile.Profile] = {}
+        self._active: list[str] = []
+
+    def _enter(self, name: str):
+        # Only one profiler can be enabled at a time, so pause the one of the enclosing stage
+        if self._active:
+            self.profiles[self._active[-1]].disable()
+        self._active.append(name)
+        self.profiles.setdefault(name, cProfile.Profile()).enable()
+
+    def _exit(self):
+        self.profiles[self._active.pop()].disable()
+        if self._active:
+            self.profiles[self._active[-1]].enable()
+
+    @contextmanager
+    def stage(self, name: str):
+        self._enter(name)
+        try:
+            with super().stage(name):
+                yield
+        finally:
+            self._exit()
+
+    @contextmanager
+    def profile(self):
+        self._enter(OTHER_STAGE)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def dump(self) -> dict[str, bytes]:
+        # The statistics of each stage, in the format of `pstats` files
+        stats = {}
+        for name, profile in self.profiles.items():
+            profile.create_stats()
+            stats[name] = marshal.dumps(profile.stats)
+        return stats
+
+
+def run_profiled(progress_path: str | None, fn, *args):
+    # Like `run_with_progress`, or `run_timed` without `progress_path`, but also profile `fn`.
+    # Returns the profiles of its stages after the result and the durations.
+    timings = ProfiledTimings(on_stage=progress_writer(progress_path) if progress_path is not None else None)
+    with timings.profile():
+        res = fn(*args, timings=timings)
+    return res, timings.durations, timings.dump()
+
+
+class ProfileStore:
+    """
+    The most recent `max_profiles` profiles, on disk so that every server process can serve them.
+
+    Each profile is a directory with its metadata and one `pstats` file per stage. Whether every
+    request is profiled is also kept here, as a flag file, so that toggling it reaches all
+    processes.
+    """
+
+    def __init__(self, profile_dir: str, max_profiles: int):
+        self.profile_dir = profile_dir
+        self.max_profiles = max_profiles
+        os.makedirs(profile_dir, exist_ok=True)
+
+    @property
+    def _flag_path(self) -> str:
+        return os.path.join(self.profile_dir, 'enabled')
+
+    @property
+    def enabled(self) -> bool:
+        return os.path.exists(self._flag_path)
+
+    def set_enabled(self, enabled: bool):
+        if enabled:
+            atomic_write(self._flag_path, b'')
+        else:
+            try:
+                os.unlink(self._flag_path)
+            except FileNotFoundError:
+                pass
+
+    def save(self, endpoint: str, reason: str, durations: dict[str, float], stats: dict[str, bytes]) -> str:
+        profile_id = _profile_id()
+        meta = {
+            "profile_id": profile_id,
+            "endpoint": endpoint,
+            "reason": reason,
+            "created_at": time.time(),
+            "durations": durations,
+            "stages": sorted(stats),
+        }
+        tmp_dir = tempfile.mkdtemp(dir=self.profile_dir, prefix='.tmp-')
+        try:
+            for stage, data in stats.items():
+                with open(os.path.join(tmp_dir, f"{stage}.prof"), 'wb') as stats_file:
+                    stats_file.write(data)
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as meta_file:
+                json.dump(meta, meta_file)
+            # Profiles appear complete or not at all
+            os.rename(tmp_dir, os.path.join(self.profile_dir, profile_id))
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self._prune(keep=profile_id)
+        return profile_id
+
+    def _ids(self) -> list[str]:
+        return sorted(name for name in os.listdir(self.profile_dir) if PROFILE_ID_PATTERN.match(name))
+
+    def _prune(self, keep: str):
+        ids = self._ids()
+        for profile_id in ids[:max(0, len(ids) - self.max_profiles)]:
+            # Another process may have saved newer profiles, but the one just saved is returned
+            if profile_id != keep:
+                shutil.rmtree(os.path.join(self.profile_dir, profile_id), ignore_errors=True)
+
+    def list(self) -> list[dict]:
+        # Newest first
+        metas = []
+        for profile_id in reversed(self._ids()):
+            meta = self.meta(profile_id)
+            if meta is not None:
+                metas.append(meta)
+        return metas
+
+    def meta(self, profile_id: str) -> dict | None:
+        # Reject anything that is not an ID before using it in a path
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.profile_dir, profile_id, 'meta.json'), 'r') as meta_file:
+                return json.load(meta_file)
+        except FileNotFoundError:
+            # Pruned in the meantime
+            return None
+
+    def _stats(self, profile_id: str, stage: str | None) -> pstats.Stats | None:
+        meta = self.meta(profile_id)
+        if meta is None or (stage is not None and stage not in meta["stages"]):
+            return None
+        stages = meta["stages"] if stage is None else [stage]
+        paths = [os.path.join(self.profile_dir, profile_id, f"{name}.prof") for name in stages]
+        return pstats.Stats(*paths, stream=io.StringIO())
+
+    def dump(self, profile_id: str, stage: str | None = None) -> bytes | None:
+        # A `pstats` file of one stage or, by default, of all stages together, e.g. for snakeviz
+        stats = self._stats(profile_id, stage)
+        return marshal.dumps(stats.stats) if stats is not None else None
+
+    def report(self, profile_id: str, stage: str | None = None, limit: int = 50) -> str | None:
+        # Text report of the `limit` functions with the most cumulative time, per stage
+        meta = self.meta(profile_id)
+        if meta is None:
+            return None
+        sections = [
+            f"{meta['endpoint']} ({meta['reason']}), "
+            f"{sum(meta['durations'].values()):.3f}s in stages: "
+            + ", ".join(f"{name}={duration:.3f}s" for name, duration in meta['durations'].items())
+        ]
+        for name in meta["stages"] if stage is None else [stage]:
+            stats = self._stats(profile_id, name)
+            if stats is None:
+                return None
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+            duration = meta["durations"].get(name)
+            header = f"== {name}" + (f" ({duration:.3f}s)" if duration is not None else "") + " =="
+            sections.append(f"{header}\n{stats.stream.getvalue()}")
+        return "\n\n".join(sections)
@@ -0,0 +1,112 @@
+import os
+import re
+import shutil
+import tempfile
+
+from .cache import content_hash, file_content_hash, normalize_json
+from .staging import link_or_copy
+
+
+VK_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class VKRegistry:
+    """
+    Verification keys and their settings, stored decoded on local disk under their content hash.
+
+    Each key lives in `<registry_dir>/<vk_id>/` as `model.vk` and `settings.json`, so it can be
+    passed to the verifier as-is without decoding or copying it per request. When the entries
+    exceed `max_bytes` in total, the least recently registered or looked up ones are removed.
+    """
+
+    def __init__(self, registry_dir: str, max_bytes: int | None = None):
+        self.registry_dir = registry_dir
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        os.makedirs(registry_dir, exist_ok=True)
+
+    def register(self, settings_json: str, vk_bytes: bytes) -> str:
+        vk_id = content_hash(vk_bytes, normalize_json(settings_json))
+
+        def write_vk(vk_path: str):
+            with open(vk_path, 'wb') as vk_file:
+                vk_file.write(vk_bytes)
+
+        return self._add(vk_id, settings_json, write_vk)
+
+    def register_file(self, settings_json: str, vk_path: str) -> str:
+        # Like `register`, for a VK that is already on disk
+        vk_id = file_content_hash(vk_path, normalize_json(settings_json))
+        return self._add(vk_id, settings_json, lambda dst_path: link_or_copy(vk_path, dst_path))
+
+    def _add(self, vk_id: str, settings_json: str, write_vk) -> str:
+        entry_dir = os.path.join(self.registry_dir, vk_id)
+        if self._touch(entry_dir):
+            return vk_id
+        # Write into a scratch directory and rename it into place, so readers never see a
+        # partially written entry
+        tmp_dir = tempfile.mkdtemp(dir=self.registry_dir, prefix='.tmp-')
+        try:
+            with open(os.path.join(tmp_dir, 'settings.json'), 'w') as settings_file:
+                settings_file.write(settings_json)
+            write_vk(os.path.join(tmp_dir, 'model.vk'))
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            # Another request registered the same key first
+            if not os.path.isdir(entry_dir):
+                raise
+        self._evict(keep=vk_id)
+        return vk_id
+
+    def _touch(self, entry_dir: str) -> bool:
+        # Mark an entry as recently used, returning whether it exists
+        try:
+            os.utime(entry_dir)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _evict(self, keep: str):
+        if self.max_bytes is None:
+            return
+        entries = []
+        total = 0
+        for name in os.listdir(self.registry_dir):
+            if not VK_ID_PATTERN.match(name):
+                continue
+            entry_dir = os.path.join(self.registry_dir, name)
+            try:
+                mtime = os.stat(entry_dir).st_mtime
+                size = sum(os.stat(os.path.join(entry_dir, file_name)).st_size for file_name in ('model.vk', 'settings.json'))
+            except FileNotFoundError:
+                continue
+            entries.append((mtime, size, name))
+            total += size
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            # Never the key just registered, whose ID is about to be returned
+            if name == keep:
+                continue
+            # Move the entry out of the way first, so that it disappears at once for readers
+            tmp_dir = tempfile.mkdtemp(dir=self.registry_dir, prefix='.tmp-')
+            try:
+                os.rename(os.path.join(self.registry_dir, name), os.path.join(tmp_dir, name))
+            except FileNotFoundError:
+                # Evicted by another server process
+                pass
+            else:
+                self.evictions += 1
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            total -= size
+
+    def lookup(self, vk_id: str) -> tuple[str, str] | None:
+        # Reject anything that is not a hash before using it in a path
+        if not VK_ID_PATTERN.match(vk_id):
+            return None
+        entry_dir = os.path.join(self.registry_dir, vk_id)
+        if not self._touch(entry_dir):
+            return None
+        return os.path.join(entry_dir, 'settings.json'), os.path.join(entry_dir, 'model.vk')
@@ -0,0 +1,77 @@
+import asyncio
+import fcntl
+import os
+from contextlib import asynccontextmanager
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent executions of the same work.
+
+    Within a process, callers of `run` with the same key share one execution. Across processes,
+    executions of the same key are serialized with a lock file in `lock_dir`, so the work itself
+    should first check whether another process has already published the result.
+    """
+
+    def __init__(self, lock_dir: str, poll_interval: float = 0.1):
+        self.lock_dir = lock_dir
+        self.poll_interval = poll_interval
+        self.coalesced = 0
+        self._in_flight: dict[str, asyncio.Task] = {}
+        os.makedirs(lock_dir, exist_ok=True)
+
+    async def run(self, key: str, fn):
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._run_locked(key, fn))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        # Shield the shared task so that a caller going away does not cancel it for the others
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every caller went away
+            task.exception()
+
+    async def _run_locked(self, key: str, fn):
+        async with self._file_lock(key):
+            return await fn()
+
+    @asynccontextmanager
+    async def _file_lock(self, key: str):
+        path = os.path.join(self.lock_dir, f"{key}.lock")
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                while True:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        await asyncio.sleep(self.poll_interval)
+                # The holder removes the lock file before releasing it. If that happened while we
+                # were waiting, we hold a lock on a removed file and have to start over.
+                try:
+                    if os.path.samestat(os.fstat(fd), os.stat(path)):
+                        break
+                except FileNotFoundError:
+                    pass
+            except BaseException:
+                os.close(fd)
+                raise
+            os.close(fd)
+        try:
+            yield
+        finally:
+            os.unlink(path)
+            os.close(fd)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._in_flight),
+            "coalesced": self.coalesced,
+        }
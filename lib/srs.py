@@ -0,0 +1,101 @@
+import asyncio
+import inspect
+import json
+import mmap
+import os
+import tempfile
+import threading
+
+
+def default_srs_dir() -> str:
+    # Where ezkl looks for SRS files when it is not given a path, e.g. when verifying a proof
+    repo_path = os.environ.get('EZKL_REPO_PATH', os.path.join(os.path.expanduser('~'), '.ezkl'))
+    return os.path.join(repo_path, 'srs')
+
+
+def srs_logrows(settings_json: str) -> int | None:
+    # Size of the SRS the circuit needs, or None if it does not use KZG commitments
+    run_args = json.loads(settings_json)['run_args']
+    if run_args.get('commitment', 'KZG') != 'KZG':
+        return None
+    return int(run_args['logrows'])
+
+
+class SRSUnavailable(Exception):
+    def __init__(self, logrows: int):
+        super().__init__(f"No SRS for logrows={logrows} and downloading it is disabled")
+        self.logrows = logrows
+
+
+class SRSStore:
+    """
+    KZG structured reference strings on local disk, one file per `logrows`.
+
+    Files are named as ezkl names them in its own SRS directory, the default `srs_dir`, so that
+    ezkl also finds them where it cannot be given a path. A missing file is downloaded once, with
+    ezkl, unless `download` is False. `preload` keeps files memory-mapped in this process so that
+    they stay in the page cache for every worker that reads them.
+    """
+
+    def __init__(self, srs_dir: str, download: bool = True):
+        self.srs_dir = srs_dir
+        self.download = download
+        self._mapped: dict[int, mmap.mmap] = {}
+        self._lock = threading.Lock()
+        os.makedirs(srs_dir, exist_ok=True)
+
+    def path(self, logrows: int) -> str:
+        return os.path.join(self.srs_dir, f"kzg{logrows}.srs")
+
+    def ensure(self, logrows: int) -> str:
+        path = self.path(logrows)
+        if os.path.isfile(path):
+            return path
+        if not self.download:
+            raise SRSUnavailable(logrows)
+        import ezkl
+
+        # Download next to the final path and rename it into place, so that concurrent
+        # downloads of the same file never leave a partial one behind
+        fd, tmp_path = tempfile.mkstemp(dir=self.srs_dir, prefix='.tmp-')
+        os.close(fd)
+        try:
+            res = ezkl.get_srs(logrows=logrows, srs_path=tmp_path)
+            if inspect.isawaitable(res):
+                # Newer ezkl versions fetch the SRS asynchronously
+                res = asyncio.run(res)
+            assert res == True
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return path
+
+    def preload(self, logrows_list: list[int]):
+        for logrows in logrows_list:
+            path = self.ensure(logrows)
+            with self._lock:
+                if logrows in self._mapped:
+                    continue
+                with open(path, 'rb') as srs_file:
+                    mapped = mmap.mmap(srs_file.fileno(), 0, access=mmap.ACCESS_READ)
+                if hasattr(mapped, 'madvise'):
+                    mapped.madvise(mmap.MADV_WILLNEED)
+                self._mapped[logrows] = mapped
+
+    def close(self):
+        with self._lock:
+            for mapped in self._mapped.values():
+                mapped.close()
+            self._mapped.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"mapped": {str(logrows): len(mapped) for logrows, mapped in sorted(self._mapped.items())}}
+
+    def __reduce__(self):
+        # Worker processes get a store for the same directory, without the mappings
+        return SRSStore, (self.srs_dir, self.download)
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+
+class ScratchDirs:
+    """
+    Reusable scratch directories for staging request files.
+
+    Directories are created once under `root` and emptied, rather than removed, when released.
+    Point `root` at a RAM-backed filesystem such as `/dev/shm` to keep staged files off disk.
+    At most `size` idle directories are kept; more are created on demand when all are in use.
+    """
+
+    def __init__(self, root: str, size: int):
+        self.staging_root = root
+        self.size = size
+        self.root = None
+        self._free = []
+
+    def open(self):
+        if self.root is not None:
+            return
+        os.makedirs(self.staging_root, exist_ok=True)
+        # Each server process gets its own directory under the shared root
+        self.root = tempfile.mkdtemp(dir=self.staging_root, prefix='zkstats-')
+        self._free = [self._new_dir() for _ in range(self.size)]
+
+    def _new_dir(self) -> str:
+        return tempfile.mkdtemp(dir=self.root, prefix='scratch-')
+
+    @contextmanager
+    def acquire(self):
+        self.open()
+        scratch_dir = self._free.pop() if self._free else self._new_dir()
+        try:
+            yield scratch_dir
+        finally:
+            if len(self._free) < self.size and _clear_dir(scratch_dir):
+                self._free.append(scratch_dir)
+            else:
+                shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    def close(self):
+        if self.root is not None:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root = None
+            self._free = []
+
+
+def _clear_dir(path: str) -> bool:
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.unlink(entry.path)
+    except OSError:
+        return False
+    return True
+
+
+def link_or_copy(src_path: str, dst_path: str):
+    # Files staged for a request are never modified afterwards, so a hard link is as good as a
+    # copy. It only works within one filesystem, e.g. not from /dev/shm to disk.
+    try:
+        os.link(src_path, dst_path)
+    except OSError:
+        shutil.copyfile(src_path, dst_path)
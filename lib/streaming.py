@@ -0,0 +1,84 @@
+import asyncio
+
+
+class MessageTooLarge(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Message exceeds the limit of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+async def read_lines(chunks, max_bytes: int):
+    # Split the async iterator of byte chunks `chunks` into its non-empty lines, e.g. the messages
+    # of an NDJSON stream, as they arrive. A line longer than `max_bytes` ends the stream.
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            if end - start > max_bytes:
+                raise MessageTooLarge(max_bytes)
+            line = bytes(buffer[start:end])
+            start = end + 1
+            if line.strip():
+                yield line
+        del buffer[:start]
+        if len(buffer) > max_bytes:
+            raise MessageTooLarge(max_bytes)
+    if buffer.strip():
+        yield bytes(buffer)
+
+
+class _Failed:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_DONE = object()
+
+
+async def map_unordered(items, fn, max_in_flight: int):
+    """
+    Await `fn` on each item of the async iterator `items` and yield the results as they complete.
+
+    At most `max_in_flight` calls run at once. Meanwhile no further items are read, so a client
+    streaming items is slowed down by the flow control of its connection rather than buffered.
+    Results are kept until they are consumed. An exception from `items` or `fn` is raised once the
+    results before it have been yielded, and closing the iterator cancels the calls in flight.
+    """
+    results: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max_in_flight)
+    tasks: set[asyncio.Task] = set()
+
+    async def run(item):
+        try:
+            results.put_nowait(await fn(item))
+        except Exception as e:
+            results.put_nowait(_Failed(e))
+        finally:
+            slots.release()
+
+    async def feed():
+        try:
+            async for item in items:
+                await slots.acquire()
+                task = asyncio.ensure_future(run(item))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            # Wait for the calls in flight, which put their results before finishing
+            if tasks:
+                await asyncio.wait(set(tasks))
+        except Exception as e:
+            results.put_nowait(_Failed(e))
+        finally:
+            results.put_nowait(_DONE)
+
+    feeder = asyncio.ensure_future(feed())
+    try:
+        while (result := await results.get()) is not _DONE:
+            if isinstance(result, _Failed):
+                raise result.error
+            yield result
+    finally:
+        feeder.cancel()
+        for task in list(tasks):
+            task.cancel()
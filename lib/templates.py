@@ -0,0 +1,53 @@
+import json
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Template:
+    # A standard statistic over `arity` columns, as a zkstats `State` method
+    name: str
+    arity: int
+    method: str
+
+
+TEMPLATES = {
+    template.name: template
+    for template in (
+        Template("mean", 1, "mean"),
+        Template("median", 1, "median"),
+        Template("variance", 1, "variance"),
+        Template("correlation", 2, "correlation"),
+        Template("linear_regression", 2, "linear_regression"),
+    )
+}
+
+
+class UnknownTemplate(ValueError):
+    def __init__(self, name: str):
+        super().__init__(f"Unknown template: {name}, expected one of {', '.join(TEMPLATES)}")
+        self.name = name
+
+
+def render_template(name: str, columns: list[str], data_shape_json: str | None = None) -> str:
+    """
+    Computation string of the template `name` over `columns`.
+
+    Equal statistics over equal columns always render to the same string, so that they share
+    cache entries however clients would have written them. If `data_shape_json` is given, the
+    columns must be in it.
+    """
+    template = TEMPLATES.get(name)
+    if template is None:
+        raise UnknownTemplate(name)
+    if len(columns) != template.arity:
+        raise ValueError(f"Template {name} takes {template.arity} column(s), got {len(columns)}")
+    if data_shape_json is not None:
+        missing = [column for column in columns if column not in json.loads(data_shape_json)]
+        if missing:
+            raise ValueError(f"Columns not in data_shape: {', '.join(missing)}")
+    # JSON string literals are valid Python string literals, whatever the column names contain
+    column_args = ", ".join(f"args[{json.dumps(column)}]" for column in columns)
+    return (
+        "def computation(state: State, args: Args):\n"
+        f"    return state.{template.method}({column_args})\n"
+    )
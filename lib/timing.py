@@ -0,0 +1,64 @@
+import os
+import time
+from contextlib import contextmanager
+
+
+class Timings:
+    """
+    Wall-clock time spent in each named stage of a request, in seconds.
+
+    Time spent in a stage that is entered several times is summed. `on_stage`, if given, is called
+    with the name of each stage as it is entered.
+    """
+
+    def __init__(self, on_stage=None):
+        self.durations: dict[str, float] = {}
+        self.on_stage = on_stage
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.on_stage is not None:
+            self.on_stage(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, duration: float):
+        self.durations[name] = self.durations.get(name, 0.0) + duration
+
+    def update(self, durations: dict[str, float]):
+        for name, duration in durations.items():
+            self.add(name, duration)
+
+    def server_timing(self) -> str:
+        # Format as a `Server-Timing` header, which uses milliseconds
+        return ", ".join(f"{name};dur={duration * 1000:.1f}" for name, duration in self.durations.items())
+
+
+def run_timed(fn, *args):
+    # Entry point for worker processes: `Timings` recorded there would otherwise be lost, so
+    # return the durations alongside the result
+    timings = Timings()
+    res = fn(*args, timings=timings)
+    return res, timings.durations
+
+
+def progress_writer(progress_path: str):
+    # `on_stage` callback writing the name of the current stage to `progress_path`, so that other
+    # processes can follow the progress
+    def write_progress(name: str):
+        tmp_path = f"{progress_path}.tmp"
+        with open(tmp_path, 'w') as progress_file:
+            progress_file.write(name)
+        os.replace(tmp_path, progress_path)
+
+    return write_progress
+
+
+def run_with_progress(progress_path: str, fn, *args):
+    # Like `run_timed`, but also reports the progress to `progress_path`
+    timings = Timings(on_stage=progress_writer(progress_path))
+    res = fn(*args, timings=timings)
+    return res, timings.durations
@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import time
+from dataclasses import dataclass
+
+from .cache import normalize_json
+from .staging import link_or_copy
+
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+@dataclass(frozen=True)
+class UploadedFile:
+    # A request payload that was streamed to disk instead of sent inline. `digest` is the SHA-256
+    # of its content.
+    path: str
+    digest: str
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds the limit of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+class UploadStoreFull(Exception):
+    def __init__(self, max_total_bytes: int):
+        super().__init__(f"Uploads being received exceed the limit of {max_total_bytes} bytes in total, retry later")
+        self.max_total_bytes = max_total_bytes
+
+
+def payload_key(payload: str | UploadedFile, normalize: bool = False) -> str:
+    # Identifies a payload in cache keys: inline JSON by its content, normalized if asked, and
+    # uploads by their digest, so that they are never read into memory
+    if isinstance(payload, UploadedFile):
+        return f"upload:{payload.digest}"
+    return normalize_json(payload) if normalize else payload
+
+
+def write_payload(payload: str | UploadedFile, path: str):
+    if isinstance(payload, UploadedFile):
+        link_or_copy(payload.path, path)
+    else:
+        with open(path, 'w') as payload_file:
+            payload_file.write(payload)
+
+
+class UploadStore:
+    """
+    Uploaded payloads on local disk, stored under the SHA-256 of their content.
+
+    Uploads are written while they are received, so memory use does not depend on their size, and
+    at most `max_bytes` are accepted. Uploads not used for `ttl` seconds are removed. Once the
+    stored uploads exceed `max_total_bytes`, the least recently used ones are removed, and uploads
+    are rejected with `UploadStoreFull` while those being received by this process exceed it.
+    """
+
+    def __init__(self, upload_dir: str, max_bytes: int, ttl: float, max_total_bytes: int):
+        self.upload_dir = upload_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_total_bytes = max_total_bytes
+        self.evictions = 0
+        self._receiving = 0
+        os.makedirs(upload_dir, exist_ok=True)
+
+    async def receive(self, chunks) -> tuple[UploadedFile, int]:
+        # Consume the async iterator `chunks`, returning the upload and its size in bytes. Files
+        # are written in a thread, so that other requests go on meanwhile.
+        await asyncio.to_thread(self.prune)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.upload_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as upload_file:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    self._receiving += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLarge(self.max_bytes)
+                    if self._receiving > self.max_total_bytes:
+                        raise UploadStoreFull(self.max_total_bytes)
+                    digest.update(chunk)
+                    await asyncio.to_thread(upload_file.write, chunk)
+            upload = UploadedFile(os.path.join(self.upload_dir, digest.hexdigest()), digest.hexdigest())
+            os.replace(tmp_path, upload.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        finally:
+            self._receiving -= size
+        await asyncio.to_thread(self._evict, upload.digest)
+        return upload, size
+
+    def lookup(self, upload_id: str) -> UploadedFile | None:
+        # Reject anything that is not a hash before using it in a path
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            return None
+        path = os.path.join(self.upload_dir, upload_id)
+        try:
+            # Using an upload keeps it for another `ttl`
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return UploadedFile(path, upload_id)
+
+    def _evict(self, keep: str):
+        entries = []
+        total = 0
+        for name in os.listdir(self.upload_dir):
+            if not UPLOAD_ID_PATTERN.match(name):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.upload_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_total_bytes:
+                break
+            # Never the upload just received, whose ID is about to be returned
+            if name == keep:
+                continue
+            try:
+                os.unlink(os.path.join(self.upload_dir, name))
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def prune(self):
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.upload_dir):
+            path = os.path.join(self.upload_dir, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
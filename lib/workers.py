@@ -0,0 +1,245 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import resource
+import signal
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+# Seconds a task may run past its timeout, to interrupt itself, before its worker is killed
+KILL_GRACE = 5
+
+
+class PoolSaturated(Exception):
+    def __init__(self, pool_name: str, retry_after: int):
+        super().__init__(f"Worker pool '{pool_name}' is saturated, retry after {retry_after}s")
+        self.pool_name = pool_name
+        self.retry_after = retry_after
+
+
+class TaskTimeout(Exception):
+    def __init__(self, pool_name: str, timeout: float):
+        super().__init__(f"Task in worker pool '{pool_name}' did not finish within {timeout}s and was killed")
+        self.pool_name = pool_name
+        self.timeout = timeout
+
+
+class TaskLimitExceeded(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Limits:
+    # Wall-clock and CPU seconds per task, and address space per worker process, in bytes
+    timeout: float | None = None
+    cpu_seconds: float | None = None
+    memory_bytes: int | None = None
+
+
+def _init_worker(limits: Limits | None, warm_up):
+    if limits is not None and limits.memory_bytes is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (limits.memory_bytes, hard))
+    if warm_up is not None:
+        warm_up()
+
+
+def _raise_limit_exceeded(signum, frame):
+    limit = "time" if signum == signal.SIGALRM else "CPU time"
+    raise TaskLimitExceeded(f"Task exceeded its {limit} limit")
+
+
+def _run_limited(limits: Limits, fn, *args):
+    # Interrupt Python code that runs past the limits, e.g. a computation that loops forever, so
+    # that the worker and what it has cached survive. The pool kills workers stuck in native code.
+    if limits.timeout is not None:
+        signal.signal(signal.SIGALRM, _raise_limit_exceeded)
+        signal.setitimer(signal.ITIMER_REAL, limits.timeout)
+    if limits.cpu_seconds is not None:
+        # RLIMIT_CPU counts the CPU time of the whole process, so move it past what earlier tasks
+        # used. Only the soft limit is lowered, the kernel then sends SIGXCPU every second.
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_limit = math.ceil(usage.ru_utime + usage.ru_stime + limits.cpu_seconds)
+        soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        signal.signal(signal.SIGXCPU, _raise_limit_exceeded)
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit if hard == resource.RLIM_INFINITY else min(cpu_limit, hard), hard))
+    try:
+        return fn(*args)
+    finally:
+        if limits.timeout is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        if limits.cpu_seconds is not None:
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+class WorkerPool:
+    """
+    Process pool for the CPU-heavy proving-system calls.
+
+    At most `max_workers` tasks run at once and at most `max_queue` more wait for a worker. Any
+    further submission raises `PoolSaturated` instead of growing the backlog.
+
+    With `preload`, workers are forked from a server process that has imported these modules, so
+    they start without importing them again and share their memory copy-on-write. `warm_up`, if
+    given, runs in every worker before its first task, and `start` waits for all workers to be warm.
+
+    Each worker is the only process of its own executor, because an executor fails all of its
+    tasks once one of its processes dies. Tasks wait for an idle worker in submission order.
+
+    `limits` bound the resources of each task. A task that runs past its timeout is first
+    interrupted in the worker. If that does not stop it within `KILL_GRACE` seconds, e.g. because
+    it is stuck in native code, its worker is killed and replaced, without affecting the tasks
+    running on other workers.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        max_queue: int,
+        retry_after: int = 5,
+        preload: tuple[str, ...] = (),
+        warm_up=None,
+        limits: Limits | None = None,
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.preload = preload
+        self.warm_up = warm_up
+        self.limits = limits
+        self.ready = warm_up is None
+        self.warm_up_error: str | None = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executors = [self._new_executor() for _ in range(max_workers)]
+        # Indexes of the workers without a task
+        self._idle: asyncio.Queue[int] = asyncio.Queue()
+        for slot in range(max_workers):
+            self._idle.put_nowait(slot)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        if self.preload:
+            # Forking the server process, which may have initialized torch, is unsafe. The fork
+            # server only imports the modules before forking workers.
+            mp_context = multiprocessing.get_context("forkserver")
+            mp_context.set_forkserver_preload(list(self.preload))
+        else:
+            mp_context = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(self.limits, self.warm_up),
+        )
+
+    async def start(self):
+        # Start every worker now instead of on the first requests. Each of these tasks holds a
+        # worker until it has run, after `warm_up`, so they are spread over all workers.
+        try:
+            await asyncio.gather(*(self.run(os.getpid) for _ in range(self.max_workers)))
+        except Exception as e:
+            self.warm_up_error = str(e) or type(e).__name__
+            raise
+        self.ready = True
+
+    def _release(self, slot: int | None = None):
+        with self._lock:
+            self._pending -= 1
+        if slot is not None:
+            self._idle.put_nowait(slot)
+
+    def _release_soon(self, loop: asyncio.AbstractEventLoop, slot: int):
+        # Called from the executor's thread when the task finishes
+        def callback(_: Future):
+            try:
+                loop.call_soon_threadsafe(self._release, slot)
+            except RuntimeError:
+                # The event loop was closed, e.g. on shutdown
+                pass
+        return callback
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                raise PoolSaturated(self.name, self.retry_after)
+            self._pending += 1
+        try:
+            slot = await self._idle.get()
+        except BaseException:
+            self._release()
+            raise
+        executor = self._executors[slot]
+        try:
+            if self.limits is not None:
+                future = executor.submit(_run_limited, self.limits, fn, *args)
+            else:
+                future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # The worker died while idle
+            self._replace_executor(slot, executor)
+            self._release(slot)
+            raise
+        except BaseException:
+            self._release(slot)
+            raise
+        # Release the worker when the task finishes in it, not when the awaiting request goes
+        # away, so that abandoned work still counts against the limit
+        future.add_done_callback(self._release_soon(asyncio.get_running_loop(), slot))
+        timeout = self.limits.timeout if self.limits is not None else None
+        result = asyncio.wrap_future(future)
+        try:
+            if timeout is None:
+                return await result
+            return await asyncio.wait_for(asyncio.shield(result), timeout + KILL_GRACE)
+        except asyncio.TimeoutError:
+            self._replace_executor(slot, executor, kill=True)
+            # Wait for the executor to fail the task, which frees its slot
+            await asyncio.wait([result])
+            if not result.cancelled():
+                result.exception()
+            raise TaskTimeout(self.name, timeout)
+        except BrokenProcessPool:
+            # The worker died (e.g. killed by the OOM killer). Replace it so later requests do not
+            # fail too.
+            self._replace_executor(slot, executor)
+            raise
+
+    def _replace_executor(self, slot: int, executor: ProcessPoolExecutor, kill: bool = False):
+        with self._lock:
+            if self._executors[slot] is not executor:
+                return
+            self._executors[slot] = self._new_executor()
+        if kill:
+            # There is no public API to stop a running task. The executor notices its worker
+            # died and fails the task.
+            for process in list((executor._processes or {}).values()):
+                process.kill()
+            executor.shutdown(wait=False)
+        else:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def in_flight(self) -> int:
+        return self._pending
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._pending - self.max_workers)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "ready": self.ready,
+        }
+
+    def shutdown(self):
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
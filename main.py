@@ -1,19 +1,280 @@
 import ast
+import asyncio
 import tempfile
 import os
+import random
 import json
 import base64
+import hmac
+import shutil
 import sys
+import time
+import uuid
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, model_validator
+from starlette.requests import ClientDisconnect
+
+from lib import (
+    calculate_vk,
+    calculate_vk_key,
+    stage_verification_key,
+    verification_key_key,
+    verify_proof as lib_verify_proof,
+    verify_proof_key,
+    verify_staged_proof,
+    warm_up,
+    ExtractComputationFailure,
+    PROVING_MODULES,
+)
+from lib.admission import AdmissionController, AdmissionQueueFull, Cost, CostModel, OverBudget
+from lib.artifacts import open_artifact_store
+from lib.cache import CacheEntry, DiskLRUCache, LRUCache
+from lib.encoding import (
+    ORJSON_AVAILABLE,
+    compress,
+    compress_chunks,
+    dumps_json,
+    negotiate_encoding,
+    negotiate_media_type,
+    read_chunks,
+)
+from lib.jobs import JobStore, process_alive, process_owner
+from lib.metrics import Histogram, render_samples
+from lib.profiling import ProfileStore, run_profiled
+from lib.registry import VKRegistry
+from lib.singleflight import SingleFlight
+from lib.srs import SRSStore, default_srs_dir
+from lib.staging import ScratchDirs
+from lib.streaming import MessageTooLarge, map_unordered, read_lines
+from lib.templates import TEMPLATES, render_template
+from lib.timing import Timings, run_timed, run_with_progress
+from lib.uploads import UploadStore, UploadStoreFull, UploadTooLarge, UploadedFile
+from lib.workers import Limits, PoolSaturated, TaskLimitExceeded, TaskTimeout, WorkerPool
+
+
+CACHE_DIR = os.environ.get("ZKSTATS_CACHE_DIR", os.path.expanduser("~/.cache/zkstats-verifier-api"))
+# Upper bound on the total size of cached verification keys, in bytes
+VK_CACHE_MAX_BYTES = int(os.environ.get("ZKSTATS_VK_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+# Upper bound on the total size of cached intermediate artifacts of key generation (dummy data,
+# ONNX models and compiled circuits), in bytes
+STAGE_CACHE_MAX_BYTES = int(os.environ.get("ZKSTATS_STAGE_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+# Upper bound on the total size of registered verification keys, in bytes
+VK_REGISTRY_MAX_BYTES = int(os.environ.get("ZKSTATS_VK_REGISTRY_MAX_BYTES", 1024 * 1024 * 1024))
+# Number of verification results, successful or not, kept in memory
+VERIFY_CACHE_SIZE = int(os.environ.get("ZKSTATS_VERIFY_CACHE_SIZE", 10000))
+
+# Key generation and verification run in separate process pools so a long setup never delays
+# verification requests. `*_MAX_QUEUE` is how many requests may wait for a busy pool before new
+# ones are rejected with 503.
+VK_WORKERS = int(os.environ.get("ZKSTATS_VK_WORKERS", 1))
+VK_MAX_QUEUE = int(os.environ.get("ZKSTATS_VK_MAX_QUEUE", 4))
+VERIFY_WORKERS = int(os.environ.get("ZKSTATS_VERIFY_WORKERS", os.cpu_count() or 1))
+VERIFY_MAX_QUEUE = int(os.environ.get("ZKSTATS_VERIFY_MAX_QUEUE", 64))
+# Key generations are admitted by their estimated time and memory. Requests estimated to exceed
+# `*_MAX_*` are rejected with 413, and running generations may be estimated to use at most
+# `VK_MEMORY_BUDGET` in total. Requests estimated to take longer than `VK_HEAVY_SECONDS` wait in a
+# separate queue, so that they do not hold up quick ones.
+VK_MAX_SECONDS = float(os.environ.get("ZKSTATS_VK_MAX_SECONDS", 600))
+VK_MAX_MEMORY_BYTES = int(os.environ.get("ZKSTATS_VK_MAX_MEMORY_BYTES", 8 * 1024 * 1024 * 1024))
+VK_MEMORY_BUDGET = int(os.environ.get("ZKSTATS_VK_MEMORY_BUDGET", 8 * 1024 * 1024 * 1024))
+VK_HEAVY_SECONDS = float(os.environ.get("ZKSTATS_VK_HEAVY_SECONDS", 30))
+# Limits on each key generation, which runs the submitted computation: wall-clock and CPU seconds,
+# and the address space of a worker process in bytes. 0 disables a limit.
+VK_TIMEOUT = float(os.environ.get("ZKSTATS_VK_TIMEOUT", 900))
+VK_CPU_LIMIT = float(os.environ.get("ZKSTATS_VK_CPU_LIMIT", 0))
+VK_MEMORY_LIMIT = int(os.environ.get("ZKSTATS_VK_MEMORY_LIMIT", 0))
+# Seconds sent in the `Retry-After` header when a pool is saturated
+RETRY_AFTER = int(os.environ.get("ZKSTATS_RETRY_AFTER", 5))
+# Maximum number of proofs in one `/verify_proofs` request
+MAX_BATCH_SIZE = int(os.environ.get("ZKSTATS_MAX_BATCH_SIZE", 1000))
+# Proofs of one `/verify_stream` connection that are verified at once, and the maximum size of
+# one message of the stream in bytes
+STREAM_MAX_IN_FLIGHT = int(os.environ.get("ZKSTATS_STREAM_MAX_IN_FLIGHT", VERIFY_WORKERS))
+STREAM_MAX_MESSAGE_BYTES = int(os.environ.get("ZKSTATS_STREAM_MAX_MESSAGE_BYTES", 16 * 1024 * 1024))
+# Maximum number of unfinished background jobs per server process
+MAX_PENDING_JOBS = int(os.environ.get("ZKSTATS_MAX_PENDING_JOBS", 100))
+# Where request files are staged for the proving system. Use a RAM-backed directory such as
+# /dev/shm to keep them off disk.
+STAGING_DIR = os.environ.get("ZKSTATS_STAGING_DIR", tempfile.gettempdir())
+# Maximum size of a payload uploaded to `/uploads`, in bytes
+MAX_UPLOAD_BYTES = int(os.environ.get("ZKSTATS_MAX_UPLOAD_BYTES", 256 * 1024 * 1024))
+# Upper bound on the total size of stored uploads, and of uploads being received by a server
+# process, in bytes
+MAX_UPLOADS_TOTAL_BYTES = int(os.environ.get("ZKSTATS_MAX_UPLOADS_TOTAL_BYTES", 1024 * 1024 * 1024))
+# Seconds an upload is kept after it was last used
+UPLOAD_TTL = int(os.environ.get("ZKSTATS_UPLOAD_TTL", 3600))
+# Serialize JSON responses with orjson, which is faster for large bodies. Needs the `orjson` package.
+USE_ORJSON = os.environ.get("ZKSTATS_ORJSON", "0") == "1"
+# Whether to report per-stage durations in a `Server-Timing` response header
+SERVER_TIMING = os.environ.get("ZKSTATS_SERVER_TIMING", "1") == "1"
+# Sizes (`logrows`) of the SRS files to fetch if missing and keep memory-mapped from startup,
+# comma-separated. Other sizes are fetched on first use unless `ZKSTATS_SRS_DOWNLOAD` is 0.
+SRS_PRELOAD = [int(logrows) for logrows in os.environ.get("ZKSTATS_SRS_PRELOAD", "").split(",") if logrows.strip()]
+SRS_DOWNLOAD = os.environ.get("ZKSTATS_SRS_DOWNLOAD", "1") == "1"
+# Store shared by the replicas of a deployment, where verification keys and compiled circuits are
+# published and looked up before running a setup: `file:///path` on a shared file system,
+# `s3://bucket/prefix`, or `local-object:///path` to try out the object store locally. Empty
+# disables it.
+ARTIFACT_STORE = os.environ.get("ZKSTATS_ARTIFACT_STORE", "")
+# Lock files that serialize generations of the same key. Put them on the shared file system too,
+# so that the replicas of a deployment generate each key once.
+LOCK_DIR = os.environ.get("ZKSTATS_LOCK_DIR", os.path.join(CACHE_DIR, "locks"))
+# Token required by the `/admin` endpoints and the `X-Profile` request header, which are disabled
+# without one
+ADMIN_TOKEN = os.environ.get("ZKSTATS_ADMIN_TOKEN", "")
+# Key generations and verifications that take longer than this many seconds keep their profile.
+# Profiling slows down the Python parts of a request, so only the fraction `PROFILE_SAMPLE_RATE` of
+# requests is profiled. 0 disables it.
+PROFILE_SLOW_SECONDS = float(os.environ.get("ZKSTATS_PROFILE_SLOW_SECONDS", 0))
+PROFILE_SAMPLE_RATE = float(os.environ.get("ZKSTATS_PROFILE_SAMPLE_RATE", 1.0))
+# Number of most recent profiles kept
+MAX_PROFILES = int(os.environ.get("ZKSTATS_MAX_PROFILES", 50))
+# Start all workers at startup, forked from a process that has imported the proving stack, and
+# run a small computation in each. `/ready` fails until they are warm.
+PREWARM = os.environ.get("ZKSTATS_PREWARM", "0") == "1"
+# JSON file with a list of `/computation_to_vk` requests, typically for templates, whose keys are
+# generated in the background at startup unless they are already cached
+TEMPLATE_PRELOAD = os.environ.get("ZKSTATS_TEMPLATE_PRELOAD", "")
+
+if USE_ORJSON and not ORJSON_AVAILABLE:
+    raise RuntimeError("ZKSTATS_ORJSON=1 requires the `orjson` package")
+JSONResponseClass = ORJSONResponse if USE_ORJSON else JSONResponse
+
+vk_cache = DiskLRUCache(os.path.join(CACHE_DIR, "vk"), VK_CACHE_MAX_BYTES)
+stage_cache = DiskLRUCache(os.path.join(CACHE_DIR, "stages"), STAGE_CACHE_MAX_BYTES)
+verify_cache = LRUCache(VERIFY_CACHE_SIZE)
+vk_flight = SingleFlight(LOCK_DIR)
+job_store = JobStore(os.path.join(CACHE_DIR, "jobs"))
+# Background jobs running in this process
+job_tasks: dict[str, asyncio.Task] = {}
+vk_registry = VKRegistry(os.path.join(CACHE_DIR, "vks"), VK_REGISTRY_MAX_BYTES)
+worker_options = {"preload": (*PROVING_MODULES, "lib"), "warm_up": warm_up} if PREWARM else {}
+vk_cost_model = CostModel()
+vk_admission = AdmissionController(
+    VK_WORKERS,
+    VK_MAX_QUEUE,
+    VK_MEMORY_BUDGET,
+    Cost(VK_MAX_SECONDS, VK_MAX_MEMORY_BYTES),
+    VK_HEAVY_SECONDS,
+    retry_after=RETRY_AFTER,
+)
+vk_limits = Limits(timeout=VK_TIMEOUT or None, cpu_seconds=VK_CPU_LIMIT or None, memory_bytes=VK_MEMORY_LIMIT or None)
+vk_pool = WorkerPool("computation_to_vk", VK_WORKERS, VK_MAX_QUEUE, RETRY_AFTER, limits=vk_limits, **worker_options)
+verify_pool = WorkerPool("verify_proof", VERIFY_WORKERS, VERIFY_MAX_QUEUE, RETRY_AFTER, **worker_options)
+srs_store = SRSStore(default_srs_dir(), SRS_DOWNLOAD)
+artifact_store = open_artifact_store(ARTIFACT_STORE)
+# Shared by all server processes, and on the same file system as the scratch directories so that
+# uploads can be hard-linked into them
+profile_store = ProfileStore(os.path.join(CACHE_DIR, "profiles"), MAX_PROFILES)
+upload_store = UploadStore(os.path.join(STAGING_DIR, "zkstats-uploads"), MAX_UPLOAD_BYTES, UPLOAD_TTL, MAX_UPLOADS_TOTAL_BYTES)
+# One scratch directory for every request that can be in a worker pool at once
+scratch_dirs = ScratchDirs(STAGING_DIR, VK_WORKERS + VK_MAX_QUEUE + VERIFY_WORKERS + VERIFY_MAX_QUEUE)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    scratch_dirs.open()
+    # Fetching and mapping large SRS files blocks, keep the event loop free meanwhile
+    await asyncio.to_thread(srs_store.preload, SRS_PRELOAD)
+    # Warm the workers in the background, so that the server answers `/ready` in the meantime
+    warm_up_task = asyncio.ensure_future(warm_up_pools()) if PREWARM else None
+    prebuild_task = asyncio.ensure_future(prebuild_vks(TEMPLATE_PRELOAD)) if TEMPLATE_PRELOAD else None
+    yield
+    for task in (warm_up_task, prebuild_task):
+        if task is not None:
+            task.cancel()
+    vk_pool.shutdown()
+    verify_pool.shutdown()
+    scratch_dirs.close()
+    srs_store.close()
 
-from lib import calculate_vk, verify_proof as lib_verify_proof, ExtractComputationFailure
 
+async def warm_up_pools():
+    for pool in (vk_pool, verify_pool):
+        try:
+            await pool.start()
+        except Exception as e:
+            # The pool stays not ready, `/ready` reports the error
+            print(f"Error: warming up the {pool.name} workers failed: {e}")
+            import traceback
+            traceback.print_exc()
 
-app = FastAPI()
+
+async def prebuild_vks(path: str):
+    # Generate the keys one after the other, as jobs, so that they do not crowd out requests and
+    # their progress shows in `/jobs`
+    with open(path, 'r') as preload_file:
+        bodies = json.load(preload_file)
+    for body in bodies:
+        try:
+            request = ComputationToVKRequest.model_validate(body)
+            precal_witness = request_payload(request.precal_witness, request.precal_witness_upload_id)
+            job_id = calculate_vk_key(request.data_shape, request.computation, request.settings, precal_witness)
+            cost = estimate_vk_cost(request)
+        except Exception as e:
+            print(f"Error: skipping an invalid request in {path}: {e}")
+            continue
+        await start_job(job_id, request, precal_witness, cost)
+
+
+# Metrics are kept per server process, so scrape every process of a multi-process deployment
+request_duration = Histogram(
+    "zkstats_request_duration_seconds",
+    "Time to handle a request, until the response headers are sent.",
+    ("endpoint", "status"),
+)
+stage_duration = Histogram(
+    "zkstats_stage_duration_seconds",
+    "Time spent in each stage of a request, as reported in the Server-Timing header.",
+    ("endpoint", "stage"),
+)
+
+
+def report_timings(endpoint: str, timings: Timings) -> dict[str, str] | None:
+    # Record the stage durations of a request and return its `Server-Timing` header, if enabled
+    for stage, duration in timings.durations.items():
+        stage_duration.observe(duration, endpoint=endpoint, stage=stage)
+    if not SERVER_TIMING:
+        return None
+    return {"Server-Timing": timings.server_timing()}
+
+
+# Failures that only depend on the request, so they are cached like results: the verifier
+# rejecting the proof or the data commitment, and malformed proofs or JSON. Any other failure,
+# e.g. ezkl not finding a file or a worker crash, may be caused by the state of the server.
+DETERMINISTIC_ERRORS = (AssertionError, ValueError, KeyError)
+
+
+def estimate_vk_cost(request: "ComputationToVKRequest") -> Cost:
+    # Reject requests over budget before any expensive work
+    try:
+        cost = vk_cost_model.estimate(request.data_shape, request.computation, request.settings)
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid request: {e}")
+    try:
+        vk_admission.check(cost)
+    except OverBudget as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return cost
+
+
+def verification_cache_key(
+    proof_json: str | UploadedFile,
+    vk_id: str | None,
+    settings_json: str | None,
+    vk_b64: str | None,
+    selected_columns: list[str],
+    data_commitment_json: str,
+) -> str:
+    vk_key = vk_id if vk_id is not None else verification_key_key(settings_json, vk_b64)
+    return verify_proof_key(proof_json, vk_key, selected_columns, data_commitment_json)
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -22,58 +283,432 @@ app.add_middleware(
     allow_credentials=False,  # Default is False
     allow_methods=["GET", "POST"],  # Specify the HTTP methods you want to allow
     allow_headers=["*"],  # Allows all headers
+    # Let browsers read the metadata sent in headers
+    expose_headers=["Server-Timing", "X-Selected-Columns", "X-VK-ID", "X-Verification-Cache"],
 )
 
+
+@app.middleware("http")
+async def observe_request_duration(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template rather than URL, so that e.g. every `/jobs/{job_id}` shares a series
+    route = request.scope.get("route")
+    endpoint = route.path if route is not None else "unmatched"
+    request_duration.observe(time.perf_counter() - start, endpoint=endpoint, status=str(response.status_code))
+    return response
+
 # ### POST `/computation_to_vk`
 
+class TemplateSpec(BaseModel):
+    # One of the templates listed by `/templates`, e.g. "mean"
+    name: str
+    # Example: ["x"]
+    columns: list[str]
+
+
 class ComputationToVKRequest(BaseModel):
     # Example: '{"x": 7, "y": 7}'
     data_shape: str
-    # Example: 'def computation(state, args): ...'
-    computation: str
+    # Example: 'def computation(state, args): ...'. Standard statistics can be given as a
+    # `template` instead, which is rendered to a computation here.
+    computation: str | None = None
+    template: TemplateSpec | None = None
     # Settings in JSON format
     settings: str
-    # Precomputed witness in JSON format
-    precal_witness: str
-
-
-# tmp_dir: str,
-# proof_json: str,
-# settings_json: str,
-# vk_path: str,
-# selected_columns: list[str],
-# data_commitment_json: str,
-class VerifyProofRequest(BaseModel):
-    # Example: 'def computation(state, args): ...'
-    proof_json: str
+    # Precomputed witness in JSON format, or the `upload_id` of it uploaded to `/uploads`
+    precal_witness: str | None = None
+    precal_witness_upload_id: str | None = None
+    # Also return the proving key. It is large and not cached, so only ask for it when needed.
+    include_pk: bool = False
+
+    @model_validator(mode='after')
+    def check_precal_witness(self):
+        if (self.precal_witness is None) == (self.precal_witness_upload_id is None):
+            raise ValueError("Exactly one of `precal_witness` and `precal_witness_upload_id` is required")
+        return self
+
+    @model_validator(mode='after')
+    def check_computation(self):
+        if (self.computation is None) == (self.template is None):
+            raise ValueError("Exactly one of `computation` and `template` is required")
+        if self.template is not None:
+            self.computation = render_template(self.template.name, self.template.columns, self.data_shape)
+        return self
+
+
+class ComputationToVKResponse(BaseModel):
+    # Base64 encoded
+    verification_key: str
+    selected_columns: list[str]
+    vk_id: str
+    # Base64 encoded, only if `include_pk` was set
+    proving_key: str | None = None
+
+
+# ### POST `/vks`
+
+class RegisterVKRequest(BaseModel):
     # Settings in JSON format
     settings_json: str
     vk_b64: str
+
+
+class VerificationKeyFields(BaseModel):
+    # Either the VK and its settings, or the `vk_id` returned by `/vks`
+    settings_json: str | None = None
+    vk_b64: str | None = None
+    vk_id: str | None = None
+
+    @model_validator(mode='after')
+    def check_verification_key(self):
+        if self.vk_id is None and (self.settings_json is None or self.vk_b64 is None):
+            raise ValueError("Either `vk_id` or both `settings_json` and `vk_b64` are required")
+        return self
+
+
+# ### POST `/verify_proof`
+
+class VerifyProofRequest(VerificationKeyFields):
+    # The proof, or the `upload_id` of it uploaded to `/uploads`
+    proof_json: str | None = None
+    proof_upload_id: str | None = None
     selected_columns: list[str]
     data_commitment_json: str
 
+    @model_validator(mode='after')
+    def check_proof(self):
+        if (self.proof_json is None) == (self.proof_upload_id is None):
+            raise ValueError("Exactly one of `proof_json` and `proof_upload_id` is required")
+        return self
+
+
+class VerifyProofResponse(BaseModel):
+    result: list[float]
+    # Whether the result was served from the verification cache
+    cached: bool
+
+
+# ### POST `/verify_proofs`
+
+class BatchProof(BaseModel):
+    proof_json: str
+    data_commitment_json: str
+
+
+class VerifyProofsGroup(VerificationKeyFields):
+    # VK, settings and selected columns are shared by all proofs in the group
+    selected_columns: list[str]
+    proofs: list[BatchProof]
+
+
+class VerifyProofsRequest(BaseModel):
+    groups: list[VerifyProofsGroup]
+
+
+class VerifyProofsItem(BaseModel):
+    # Either the result or why the proof could not be verified
+    result: list[float] | None = None
+    error: str | None = None
+    cached: bool
+
+
+class VerifyProofsResponse(BaseModel):
+    # Per group, the items in the order of the proofs
+    results: list[list[VerifyProofsItem]]
+
+
+def lookup_vk(vk_id: str) -> tuple[str, str]:
+    paths = vk_registry.lookup(vk_id)
+    if paths is None:
+        raise HTTPException(status_code=404, detail=f"Unknown vk_id: {vk_id}")
+    return paths
 
-@app.post("/computation_to_vk")
-async def computation_to_vk(request: ComputationToVKRequest):
+
+@app.post("/vks")
+async def register_vk(request: RegisterVKRequest):
     try:
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            selected_columns, vk_path = calculate_vk(
+        vk_bytes = base64.b64decode(request.vk_b64, validate=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid vk_b64: {e}")
+    vk_id = vk_registry.register(request.settings_json, vk_bytes)
+    return JSONResponseClass(content={"vk_id": vk_id})
+
+
+@app.get("/vks/{vk_id}")
+async def get_vk(vk_id: str):
+    lookup_vk(vk_id)
+    return JSONResponseClass(content={"vk_id": vk_id})
+
+
+@app.get("/templates")
+async def templates():
+    # Standard statistics that `/computation_to_vk` accepts as a `template`
+    return JSONResponseClass(content={
+        "templates": [{"name": template.name, "columns": template.arity} for template in TEMPLATES.values()],
+    })
+
+
+@app.post("/uploads", status_code=201)
+async def upload(request: Request, content_length: int | None = Header(None)):
+    # The body is the raw payload, streamed to disk as it arrives
+    if content_length is not None and content_length > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=str(UploadTooLarge(MAX_UPLOAD_BYTES)))
+    try:
+        uploaded, size = await upload_store.receive(request.stream())
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadStoreFull as e:
+        raise HTTPException(status_code=507, detail=str(e), headers={"Retry-After": str(RETRY_AFTER)})
+    return JSONResponseClass(content={"upload_id": uploaded.digest, "size": size}, status_code=201)
+
+
+def request_payload(inline: str | None, upload_id: str | None) -> str | UploadedFile:
+    # A payload is sent either inline or as the ID of an upload to `/uploads`
+    if upload_id is None:
+        return inline
+    uploaded = upload_store.lookup(upload_id)
+    if uploaded is None:
+        raise HTTPException(status_code=404, detail=f"Unknown upload_id: {upload_id}")
+    return uploaded
+
+
+async def generate_vk(
+    cache_key: str,
+    request: ComputationToVKRequest,
+    precal_witness: str | UploadedFile,
+    cost: Cost,
+    profile: str | None = None,
+) -> tuple[CacheEntry, bytes | None, dict[str, float], str | None]:
+    # Also returns the ID of the profile of the generation, if one was kept
+    timings = Timings()
+    if not request.include_pk:
+        # Another server process may have generated the key while we waited for it. The caller
+        # already counted the miss.
+        entry = vk_cache.get(cache_key, count=False)
+        if entry is None and artifact_store is not None:
+            # Or another replica
+            with timings.stage("artifact_store"):
+                entry = await fetch_shared_vk(cache_key)
+        if entry is not None:
+            return entry, None, timings.durations, None
+    pk_content = None
+    profile_id = None
+    start = time.perf_counter()
+    async with vk_admission.admit(cost):
+        timings.add("admission", time.perf_counter() - start)
+        with scratch_dirs.acquire() as tmp_dir:
+            pk_path = os.path.join(tmp_dir, 'model.pk') if request.include_pk else None
+            task = (
+                calculate_vk,
                 tmp_dir,
                 request.data_shape,
                 request.computation,
                 request.settings,
-                request.precal_witness
+                precal_witness,
+                pk_path,
+                stage_cache,
+                srs_store,
+                artifact_store,
             )
-            print("!@# computation_to_vk: 1")
-            # Read the verification key file
+            # Report progress under the cache key, which is also the job ID in `/jobs`
+            progress_path = job_store.progress_path(cache_key)
+            try:
+                if profile is None:
+                    (selected_columns, vk_path), durations = await vk_pool.run(run_with_progress, progress_path, *task)
+                else:
+                    (selected_columns, vk_path), durations, stats = await vk_pool.run(run_profiled, progress_path, *task)
+                    profile_id = keep_profile("/computation_to_vk", profile, durations, stats)
+            finally:
+                job_store.clear_progress(cache_key)
+            timings.update(durations)
+            with timings.stage("staging"):
+                entry = vk_cache.put_file(cache_key, vk_path, {"selected_columns": selected_columns})
+                if pk_path is not None:
+                    with open(pk_path, 'rb') as pk_file:
+                        pk_content = pk_file.read()
+    if artifact_store is not None:
+        with timings.stage("artifact_store"):
+            await publish_shared_vk(cache_key, entry)
+    return entry, pk_content, timings.durations, profile_id
+
+
+def profiling_reason(x_profile: str | None, authorization: str | None) -> str | None:
+    # Why to profile a request, if at all: asked for with the `X-Profile` header, profiling
+    # enabled through `/admin/profiling`, or sampled in case it turns out slow
+    if x_profile is not None and x_profile != "0":
+        check_admin(authorization)
+        return "requested"
+    if profile_store.enabled:
+        return "enabled"
+    if PROFILE_SLOW_SECONDS > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def keep_profile(endpoint: str, reason: str, durations: dict[str, float], stats: dict[str, bytes]) -> str | None:
+    # Sampled profiles are only kept for slow requests
+    if reason == "sampled" and sum(durations.values()) < PROFILE_SLOW_SECONDS:
+        return None
+    return profile_store.save(endpoint, reason, durations, stats)
+
+
+def check_admin(authorization: str | None):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled, set ZKSTATS_ADMIN_TOKEN")
+    if not hmac.compare_digest((authorization or "").encode('utf-8'), f"Bearer {ADMIN_TOKEN}".encode('utf-8')):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+async def fetch_shared_vk(cache_key: str) -> CacheEntry | None:
+    try:
+        with scratch_dirs.acquire() as tmp_dir:
+            vk_path = os.path.join(tmp_dir, 'model.vk')
+            meta = await asyncio.to_thread(artifact_store.fetch, cache_key, vk_path)
+            return vk_cache.put_file(cache_key, vk_path, meta) if meta is not None else None
+    except Exception as e:
+        # An unreachable store only costs a setup
+        print(f"Error: fetching {cache_key} from the artifact store failed: {e}")
+        return None
+
+
+async def publish_shared_vk(cache_key: str, entry: CacheEntry):
+    try:
+        await asyncio.to_thread(artifact_store.publish, cache_key, entry.path, entry.meta)
+    except Exception as e:
+        # The key is in the local cache, other replicas generate it themselves
+        print(f"Error: publishing {cache_key} to the artifact store failed: {e}")
+
+
+# Response formats of `/computation_to_vk`. The raw VK cannot include a proving key.
+VK_MEDIA_TYPES = ["application/json", "application/octet-stream", "multipart/mixed"]
+
+
+def vk_response(
+    media_type: str,
+    encoding: str | None,
+    vk_path: str,
+    selected_columns: list[str],
+    vk_id: str,
+    pk_content: bytes | None,
+    timings: Timings,
+) -> Response:
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    if media_type == "application/json":
+        with timings.stage("encode"):
             with open(vk_path, 'rb') as vk_file:
                 vk_content = vk_file.read()
-            print("!@# computation_to_vk: 2")
-        # Return the file content and selected columns
-        return JSONResponse(content={
-            "verification_key": base64.b64encode(vk_content).decode('utf-8'),
-            "selected_columns": selected_columns
-        })
+            # Return the file content and selected columns
+            content = {
+                "verification_key": base64.b64encode(vk_content).decode('utf-8'),
+                "selected_columns": selected_columns,
+                "vk_id": vk_id,
+            }
+            if pk_content is not None:
+                content["proving_key"] = base64.b64encode(pk_content).decode('utf-8')
+            body = compress(dumps_json(content, USE_ORJSON), encoding)
+        headers.update(report_timings("/computation_to_vk", timings) or {})
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    # Open the file now, so that it stays readable while streaming even if it is evicted
+    vk_file = open(vk_path, 'rb')
+    if media_type == "application/octet-stream":
+        headers["X-Selected-Columns"] = json.dumps(selected_columns)
+        headers["X-VK-ID"] = vk_id
+        chunks = read_chunks(vk_file)
+    else:
+        boundary = uuid.uuid4().hex
+        media_type = f"multipart/mixed; boundary={boundary}"
+        metadata = {"selected_columns": selected_columns, "vk_id": vk_id}
+        chunks = multipart_chunks(boundary, [
+            ("application/json", "metadata", [dumps_json(metadata, USE_ORJSON)]),
+            ("application/octet-stream", "verification_key", read_chunks(vk_file)),
+            *([("application/octet-stream", "proving_key", [pk_content])] if pk_content is not None else []),
+        ])
+    # The body is encoded while it is sent, after the `Server-Timing` header
+    headers.update(report_timings("/computation_to_vk", timings) or {})
+    return StreamingResponse(compress_chunks(chunks, encoding), media_type=media_type, headers=headers)
+
+
+def multipart_chunks(boundary: str, parts: list[tuple[str, str, object]]):
+    for content_type, name, chunks in parts:
+        yield (
+            f"--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Disposition: attachment; name=\"{name}\"\r\n"
+            "\r\n"
+        ).encode('utf-8')
+        yield from chunks
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode('utf-8')
+
+
+@app.post("/computation_to_vk", response_model=ComputationToVKResponse)
+async def computation_to_vk(
+    request: ComputationToVKRequest,
+    accept: str | None = Header(None),
+    accept_encoding: str | None = Header(None),
+    x_profile: str | None = Header(None),
+    authorization: str | None = Header(None),
+):
+    media_type = negotiate_media_type(accept, VK_MEDIA_TYPES)
+    if media_type is None or (media_type == "application/octet-stream" and request.include_pk):
+        raise HTTPException(status_code=406, detail=f"Supported media types: {', '.join(VK_MEDIA_TYPES)}")
+    encoding = negotiate_encoding(accept_encoding)
+    profile = profiling_reason(x_profile, authorization)
+    try:
+        timings = Timings()
+        with timings.stage("cache"):
+            precal_witness = request_payload(request.precal_witness, request.precal_witness_upload_id)
+            cache_key = calculate_vk_key(
+                request.data_shape,
+                request.computation,
+                request.settings,
+                precal_witness
+            )
+            # Proving keys are not cached, so requests for one always run the setup
+            entry = vk_cache.get(cache_key) if not request.include_pk else None
+        pk_content = None
+        profile_id = None
+        if entry is None:
+            cost = estimate_vk_cost(request)
+            if request.include_pk:
+                entry, pk_content, durations, profile_id = await generate_vk(
+                    cache_key, request, precal_witness, cost, profile
+                )
+            else:
+                # Identical requests, in this or another server process, share one generation
+                entry, pk_content, durations, profile_id = await vk_flight.run(
+                    cache_key,
+                    lambda: generate_vk(cache_key, request, precal_witness, cost, profile),
+                )
+            timings.update(durations)
+        with timings.stage("staging"):
+            # Register the key so clients can verify against it without uploading it again
+            vk_id = vk_registry.register_file(request.settings, entry.path)
+        response = vk_response(
+            media_type,
+            encoding,
+            entry.path,
+            entry.meta["selected_columns"],
+            vk_id,
+            pk_content,
+            timings,
+        )
+        if profile_id is not None:
+            response.headers["X-Profile-ID"] = profile_id
+        return response
+    except HTTPException:
+        raise
+    except AdmissionQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except (TaskTimeout, TaskLimitExceeded) as e:
+        # The computation, not the server, is at fault
+        raise HTTPException(status_code=422, detail=str(e))
+    except PoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         print(f"Error: {e}")
         import traceback
@@ -81,26 +716,573 @@ async def computation_to_vk(request: ComputationToVKRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/verify_proof")
-async def verify_proof(request: VerifyProofRequest):
+# Stages of `lib.calculate_vk` as reported by `/jobs`
+JOB_STAGES = {
+    "staging": "parse",
+    "extract_computation": "parse",
+    "computation_to_model": "model",
+    "define_calculation": "model",
+    "compile": "compile",
+    "srs": "setup",
+    "setup": "setup",
+}
+
+
+async def run_vk_job(job_id: str, request: ComputationToVKRequest, precal_witness: str | UploadedFile, cost: Cost):
     try:
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            res = lib_verify_proof(
-                tmp_dir,
-                request.proof_json,
+        entry = vk_cache.get(job_id)
+        while entry is None:
+            try:
+                entry, _, durations, _ = await vk_flight.run(
+                    job_id,
+                    lambda: generate_vk(job_id, request, precal_witness, cost, profiling_reason(None, None)),
+                )
+                timings = Timings()
+                timings.update(durations)
+                report_timings("/jobs/computation_to_vk", timings)
+            except (AdmissionQueueFull, PoolSaturated) as e:
+                # Jobs wait for a free worker instead of failing
+                await asyncio.sleep(e.retry_after)
+        with open(entry.path, 'rb') as vk_file:
+            vk_id = vk_registry.register(request.settings, vk_file.read())
+        # The VK stays in the registry until it is evicted there, so the result outlives the VK
+        # cache and restarts
+        job_store.save(job_id, {
+            "status": "done",
+            "vk_id": vk_id,
+            "selected_columns": entry.meta["selected_columns"],
+        })
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        job_store.save(job_id, {"status": "failed", "error": str(e)})
+
+
+@app.post("/jobs/computation_to_vk", status_code=202)
+async def submit_computation_to_vk_job(request: ComputationToVKRequest):
+    if request.include_pk:
+        raise HTTPException(status_code=400, detail="`include_pk` is not supported for jobs")
+    precal_witness = request_payload(request.precal_witness, request.precal_witness_upload_id)
+    try:
+        # Identical requests map to the same job
+        job_id = calculate_vk_key(
+            request.data_shape,
+            request.computation,
+            request.settings,
+            precal_witness
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cost = estimate_vk_cost(request)
+    state = job_store.load(job_id)
+    if job_id not in job_tasks and not (state is not None and job_active(job_id, state)):
+        if len(job_tasks) >= MAX_PENDING_JOBS:
+            raise HTTPException(status_code=503, detail="Too many pending jobs", headers={"Retry-After": str(RETRY_AFTER)})
+        start_job(job_id, request, precal_witness, cost)
+    return JSONResponseClass(content={"job_id": job_id}, status_code=202)
+
+
+def start_job(job_id: str, request: ComputationToVKRequest, precal_witness: str | UploadedFile, cost: Cost) -> asyncio.Task:
+    job_store.save(job_id, {"status": "queued", **process_owner()})
+    task = job_tasks[job_id] = asyncio.ensure_future(run_vk_job(job_id, request, precal_witness, cost))
+    task.add_done_callback(lambda _: job_tasks.pop(job_id, None))
+    return task
+
+
+def job_running(job_id: str, state: dict) -> bool:
+    # Whether the server process that took a queued job, which may be another worker of this
+    # server, still runs it. Its PID may have been reused since, even by this process, whose
+    # running jobs are all in `job_tasks`.
+    if state["pid"] == os.getpid():
+        return job_id in job_tasks
+    return process_alive(state["pid"], state.get("started"))
+
+
+def job_active(job_id: str, state: dict) -> bool:
+    # Done jobs are served as they are, queued jobs while they run
+    if state["status"] == "done":
+        return vk_registry.lookup(state["vk_id"]) is not None
+    return state["status"] == "queued" and job_running(job_id, state)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    state = job_store.load(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job_id: {job_id}")
+    content = {"job_id": job_id, "status": state["status"]}
+    if state["status"] == "queued":
+        if not job_running(job_id, state):
+            content["status"] = "failed"
+            content["error"] = "The server stopped before the job finished, submit it again"
+        else:
+            stage = job_store.read_progress(job_id)
+            if stage is not None:
+                content["status"] = "running"
+                content["stage"] = JOB_STAGES.get(stage, stage)
+    elif state["status"] == "failed":
+        content["error"] = state["error"]
+    elif state["status"] == "done":
+        paths = vk_registry.lookup(state["vk_id"])
+        if paths is None:
+            content["status"] = "failed"
+            content["error"] = "The verification key was evicted, submit the job again"
+        else:
+            with open(paths[1], 'rb') as vk_file:
+                vk_content = vk_file.read()
+            content["verification_key"] = base64.b64encode(vk_content).decode('utf-8')
+            content["selected_columns"] = state["selected_columns"]
+            content["vk_id"] = state["vk_id"]
+    return JSONResponseClass(content=content)
+
+
+@app.post("/verify_proof", response_model=VerifyProofResponse)
+async def verify_proof(
+    request: VerifyProofRequest,
+    x_profile: str | None = Header(None),
+    authorization: str | None = Header(None),
+):
+    profile = profiling_reason(x_profile, authorization)
+    profile_id = None
+    timings = Timings()
+    with timings.stage("cache"):
+        proof_json = request_payload(request.proof_json, request.proof_upload_id)
+        try:
+            cache_key = verification_cache_key(
+                proof_json,
+                request.vk_id,
                 request.settings_json,
                 request.vk_b64,
                 request.selected_columns,
                 request.data_commitment_json
             )
-            res_json = json.dumps({"result": res})
-            return JSONResponse(content=res_json)
+        except ValueError as e:
+            # The settings are parsed to normalize them
+            raise HTTPException(status_code=400, detail=f"Invalid settings_json: {e}")
+        cached = verify_cache.get(cache_key)
+    if cached is not None:
+        return verification_response(cached, True, timings)
+    try:
+        with scratch_dirs.acquire() as tmp_dir:
+            if request.vk_id is not None:
+                # The registered VK is already on disk, only the proof needs to be written
+                settings_path, vk_path = lookup_vk(request.vk_id)
+                task = (
+                    verify_staged_proof,
+                    tmp_dir,
+                    proof_json,
+                    settings_path,
+                    vk_path,
+                    request.selected_columns,
+                    request.data_commitment_json,
+                    srs_store,
+                )
+            else:
+                task = (
+                    lib_verify_proof,
+                    tmp_dir,
+                    proof_json,
+                    request.settings_json,
+                    request.vk_b64,
+                    request.selected_columns,
+                    request.data_commitment_json,
+                    srs_store,
+                )
+            if profile is None:
+                res, durations = await verify_pool.run(run_timed, *task)
+            else:
+                res, durations, stats = await verify_pool.run(run_profiled, None, *task)
+                profile_id = keep_profile("/verify_proof", profile, durations, stats)
+            timings.update(durations)
+    except HTTPException:
+        raise
+    except PoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         print(f"Error: {e}")
         import traceback
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+        if isinstance(e, DETERMINISTIC_ERRORS):
+            verify_cache.put(cache_key, ("error", str(e)))
+        raise HTTPException(status_code=500, detail=str(e), headers={"X-Verification-Cache": "miss"})
+    outcome = ("result", res)
+    verify_cache.put(cache_key, outcome)
+    response = verification_response(outcome, False, timings)
+    if profile_id is not None:
+        response.headers["X-Profile-ID"] = profile_id
+    return response
+
+
+def verification_response(outcome: tuple[str, object], cached: bool, timings: Timings) -> Response:
+    kind, value = outcome
+    headers = {"X-Verification-Cache": "hit" if cached else "miss", **(report_timings("/verify_proof", timings) or {})}
+    if kind == "error":
+        raise HTTPException(status_code=500, detail=value, headers=headers)
+    return JSONResponseClass(content={"result": value, "cached": cached}, headers=headers)
+
+
+async def verify_uncached_proof(
+    cache_key: str,
+    work_dir: str,
+    proof_json: str | UploadedFile,
+    settings_path: str,
+    vk_path: str,
+    selected_columns: list[str],
+    data_commitment_json: str,
+    timings: Timings,
+) -> dict:
+    # Verify one proof of a batch or stream against a VK on disk and cache the outcome. Errors are
+    # reported for this proof only, the others are unaffected.
+    try:
+        os.mkdir(work_dir)
+        res, durations = await verify_pool.run(
+            run_timed,
+            verify_staged_proof,
+            work_dir,
+            proof_json,
+            settings_path,
+            vk_path,
+            selected_columns,
+            data_commitment_json,
+            srs_store,
+        )
+        timings.update(durations)
+    except Exception as e:
+        if isinstance(e, DETERMINISTIC_ERRORS):
+            verify_cache.put(cache_key, ("error", str(e)))
+        return {"error": str(e), "cached": False}
+    verify_cache.put(cache_key, ("result", res))
+    return {"result": res, "cached": False}
+
+
+@app.post("/verify_proofs", response_model=VerifyProofsResponse)
+async def verify_proofs(request: VerifyProofsRequest):
+    num_proofs = sum(len(group.proofs) for group in request.groups)
+    if num_proofs > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch of {num_proofs} proofs exceeds the limit of {MAX_BATCH_SIZE}")
+    # Keep at most one task per worker in the pool so a large batch does not fill the queue
+    # and starve single `/verify_proof` requests
+    semaphore = asyncio.Semaphore(verify_pool.max_workers)
+    timings = Timings()
+
+    async def verify_item(
+        work_dir: str,
+        settings_path: str,
+        vk_path: str,
+        vk_key: str,
+        group: VerifyProofsGroup,
+        proof: BatchProof,
+    ):
+        cache_key = verify_proof_key(proof.proof_json, vk_key, group.selected_columns, proof.data_commitment_json)
+        cached = verify_cache.get(cache_key)
+        if cached is not None:
+            kind, value = cached
+            return {kind: value, "cached": True}
+        async with semaphore:
+            return await verify_uncached_proof(
+                cache_key,
+                work_dir,
+                proof.proof_json,
+                settings_path,
+                vk_path,
+                group.selected_columns,
+                proof.data_commitment_json,
+                timings,
+            )
 
+    async def verify_group(group_dir: str, group: VerifyProofsGroup):
+        os.mkdir(group_dir)
+        try:
+            if group.vk_id is not None:
+                settings_path, vk_path = lookup_vk(group.vk_id)
+                vk_key = group.vk_id
+            else:
+                # Decode and write the shared artifacts once per group. Hashing the key parses
+                # the settings, so invalid settings fail this group only.
+                with timings.stage("staging"):
+                    vk_key = verification_key_key(group.settings_json, group.vk_b64)
+                    settings_path, vk_path = stage_verification_key(group_dir, group.settings_json, group.vk_b64)
+        except HTTPException as e:
+            return [{"error": e.detail, "cached": False} for _ in group.proofs]
+        except Exception as e:
+            return [{"error": f"Invalid verification key: {e}", "cached": False} for _ in group.proofs]
+        return await asyncio.gather(*(
+            verify_item(os.path.join(group_dir, str(j)), settings_path, vk_path, vk_key, group, proof)
+            for j, proof in enumerate(group.proofs)
+        ))
+
+    with scratch_dirs.acquire() as tmp_dir:
+        results = await asyncio.gather(*(
+            verify_group(os.path.join(tmp_dir, str(i)), group)
+            for i, group in enumerate(request.groups)
+        ))
+    # Durations of the proofs are summed, although they were verified in parallel
+    return JSONResponseClass(content={"results": results}, headers=report_timings("/verify_proofs", timings))
+
+
+# ### POST `/verify_stream`
+
+# Required fields of a `/verify_stream` message. Messages are checked by hand, since validating a
+# pydantic model costs more than answering a proof from the verification cache.
+STREAM_MESSAGE_FIELDS = {
+    "vk_id": str,
+    "proof_json": str,
+    "selected_columns": list,
+    "data_commitment_json": str,
+}
+
+
+def check_stream_message(message):
+    if not isinstance(message, dict):
+        raise ValueError("Expected a JSON object")
+    for field, field_type in STREAM_MESSAGE_FIELDS.items():
+        if not isinstance(message.get(field), field_type):
+            raise ValueError(f"Missing or invalid field `{field}`")
+    if not all(isinstance(column, str) for column in message["selected_columns"]):
+        raise ValueError("Invalid field `selected_columns`")
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    # Starlette's `StreamingResponse` may listen for a disconnect while it streams, which would
+    # take messages of the request body away from the body iterator still reading it
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@app.post("/verify_stream")
+async def verify_stream(request: Request):
+    # The request and the response are NDJSON streams of proofs and of their results, which are
+    # sent as soon as each proof is verified
+    async def verify_message(work_dir: str, line: bytes) -> dict:
+        timings = Timings()
+        client_id = None
+        try:
+            message = json.loads(line)
+            client_id = message.get("id") if isinstance(message, dict) else None
+            check_stream_message(message)
+        except ValueError as e:
+            return {"id": client_id, "error": f"Invalid message: {e}", "cached": False}
+        with timings.stage("cache"):
+            cache_key = verification_cache_key(
+                message["proof_json"],
+                message["vk_id"],
+                None,
+                None,
+                message["selected_columns"],
+                message["data_commitment_json"],
+            )
+            cached = verify_cache.get(cache_key)
+        if cached is not None:
+            kind, value = cached
+            return {"id": client_id, kind: value, "cached": True}
+        paths = vk_registry.lookup(message["vk_id"])
+        if paths is None:
+            return {"id": client_id, "error": f"Unknown vk_id: {message['vk_id']}", "cached": False}
+        settings_path, vk_path = paths
+        try:
+            outcome = await verify_uncached_proof(
+                cache_key,
+                work_dir,
+                message["proof_json"],
+                settings_path,
+                vk_path,
+                message["selected_columns"],
+                message["data_commitment_json"],
+                timings,
+            )
+        finally:
+            # The stream may go on for long, do not keep the files of every proof until its end
+            shutil.rmtree(work_dir, ignore_errors=True)
+        report_timings("/verify_stream", timings)
+        return {"id": client_id, **outcome}
+
+    async def results():
+        with scratch_dirs.acquire() as tmp_dir:
+            try:
+                # Verifications abandoned on disconnect keep running in the workers after the
+                # scratch directory is reused, so the names of their directories are never reused
+                async for result in map_unordered(
+                    read_lines(request.stream(), STREAM_MAX_MESSAGE_BYTES),
+                    lambda line: verify_message(os.path.join(tmp_dir, uuid.uuid4().hex), line),
+                    STREAM_MAX_IN_FLIGHT,
+                ):
+                    yield dumps_json(result, USE_ORJSON) + b"\n"
+            except MessageTooLarge as e:
+                # The rest of the stream cannot be split into messages reliably
+                yield dumps_json({"error": str(e)}, USE_ORJSON) + b"\n"
+            except ClientDisconnect:
+                pass
+
+    return DuplexStreamingResponse(results(), media_type="application/x-ndjson")
+
+
+# ### Admin endpoints
+
+class ProfilingToggle(BaseModel):
+    # Profile every `/computation_to_vk` and `/verify_proof` request
+    enabled: bool
+
+
+@app.get("/admin/profiling")
+async def get_profiling(authorization: str | None = Header(None)):
+    check_admin(authorization)
+    return JSONResponseClass(content={
+        "enabled": profile_store.enabled,
+        "slow_seconds": PROFILE_SLOW_SECONDS,
+        "sample_rate": PROFILE_SAMPLE_RATE,
+    })
+
+
+@app.put("/admin/profiling")
+async def set_profiling(toggle: ProfilingToggle, authorization: str | None = Header(None)):
+    check_admin(authorization)
+    # Applies to every server process sharing `ZKSTATS_CACHE_DIR`
+    profile_store.set_enabled(toggle.enabled)
+    return await get_profiling(authorization)
+
+
+@app.get("/admin/profiles")
+async def list_profiles(authorization: str | None = Header(None)):
+    check_admin(authorization)
+    return JSONResponseClass(content={"profiles": profile_store.list()})
+
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = "text",
+    stage: str | None = None,
+    authorization: str | None = Header(None),
+):
+    check_admin(authorization)
+    if format == "text":
+        report = profile_store.report(profile_id, stage)
+        if report is not None:
+            return Response(content=report, media_type="text/plain; charset=utf-8")
+    elif format == "pstats":
+        data = profile_store.dump(profile_id, stage)
+        if data is not None:
+            filename = f"{profile_id}-{stage}.prof" if stage is not None else f"{profile_id}.prof"
+            return Response(
+                content=data,
+                media_type="application/octet-stream",
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+            )
+    else:
+        raise HTTPException(status_code=400, detail="`format` must be `text` or `pstats`")
+    raise HTTPException(status_code=404, detail=f"Unknown profile_id or stage: {profile_id}")
+
+
+@app.get("/stats")
+async def stats():
+    return JSONResponseClass(content={
+        "vk_cache": vk_cache.stats(),
+        "vk_single_flight": vk_flight.stats(),
+        "pending_jobs": len(job_tasks),
+        "verify_cache": verify_cache.stats(),
+        "vk_pool": vk_pool.stats(),
+        "verify_pool": verify_pool.stats(),
+        "vk_admission": vk_admission.stats(),
+        "srs": srs_store.stats(),
+        "artifact_store": artifact_store.stats() if artifact_store is not None else None,
+    })
+
+
+@app.get("/ready")
+async def ready():
+    # Readiness probe: whether the worker pools are warm, which they are from the start unless
+    # `ZKSTATS_PREWARM` is set
+    pools = {}
+    for pool in (vk_pool, verify_pool):
+        pools[pool.name] = {"ready": pool.ready}
+        if pool.warm_up_error is not None:
+            pools[pool.name]["error"] = pool.warm_up_error
+    is_ready = all(pool["ready"] for pool in pools.values())
+    return JSONResponseClass(content={"ready": is_ready, "pools": pools}, status_code=200 if is_ready else 503)
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text exposition format
+    caches = {"vk": vk_cache.stats(), "verify": verify_cache.stats()}
+    pools = {pool.name: pool.stats() for pool in (vk_pool, verify_pool)}
+    flight = vk_flight.stats()
+    admission = vk_admission.stats()
+    lines = [
+        *request_duration.render(),
+        *stage_duration.render(),
+        *(
+            line
+            for field in ("hits", "misses", "evictions")
+            for line in render_samples(
+                f"zkstats_cache_{field}_total",
+                "counter",
+                f"Cache {field} since the server started.",
+                [({"cache": name}, cache_stats[field]) for name, cache_stats in caches.items()],
+            )
+        ),
+        *render_samples(
+            "zkstats_cache_hit_ratio",
+            "gauge",
+            "Fraction of cache lookups that were hits since the server started.",
+            [({"cache": name}, cache_stats["hit_rate"]) for name, cache_stats in caches.items()],
+        ),
+        *render_samples(
+            "zkstats_pool_workers",
+            "gauge",
+            "Worker processes in each pool.",
+            [({"pool": name}, pool_stats["max_workers"]) for name, pool_stats in pools.items()],
+        ),
+        *render_samples(
+            "zkstats_pool_in_flight",
+            "gauge",
+            "Tasks submitted to each pool and not finished, running or queued.",
+            [({"pool": name}, pool_stats["in_flight"]) for name, pool_stats in pools.items()],
+        ),
+        *render_samples(
+            "zkstats_pool_queue_depth",
+            "gauge",
+            "Tasks waiting for a free worker in each pool.",
+            [({"pool": name}, pool_stats["queue_depth"]) for name, pool_stats in pools.items()],
+        ),
+        *render_samples(
+            "zkstats_vk_admission_queued",
+            "gauge",
+            "Key generations waiting for admission, by queue.",
+            [({"queue": name}, queued) for name, queued in admission["queued"].items()],
+        ),
+        *render_samples(
+            "zkstats_vk_admission_memory_bytes",
+            "gauge",
+            "Estimated memory of the admitted key generations.",
+            [({}, admission["memory_in_use"])],
+        ),
+        *render_samples(
+            "zkstats_vk_admission_rejected_total",
+            "counter",
+            "Key generations rejected as over budget or because the queue was full.",
+            [({}, admission["rejected"])],
+        ),
+        *render_samples(
+            "zkstats_vk_generations_in_flight",
+            "gauge",
+            "Verification key generations running in this process.",
+            [({}, flight["in_flight"])],
+        ),
+        *render_samples(
+            "zkstats_vk_generations_coalesced_total",
+            "counter",
+            "Requests that joined a verification key generation already in flight.",
+            [({}, flight["coalesced"])],
+        ),
+        *render_samples(
+            "zkstats_pending_jobs",
+            "gauge",
+            "Background jobs submitted to this process and not finished.",
+            [({}, len(job_tasks))],
+        ),
+    ]
+    return Response(content="\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.admission import AdmissionController, AdmissionQueueFull, Cost, CostModel, OverBudget
+
+COMPUTATION = """def computation(state: State, args: Args):
+    x = args["x"]
+    return state.mean(x)
+"""
+
+
+def test_cost_model_scales_with_logrows_and_data():
+    model = CostModel()
+    settings_json = (current_dir / "assets" / "settings.json").read_text()
+    small = model.estimate('{"x": 7, "y": 7}', COMPUTATION, settings_json)
+    more_data = model.estimate('{"x": 70000, "y": 70000}', COMPUTATION, settings_json)
+    settings = json.loads(settings_json)
+    settings["run_args"]["logrows"] = 20
+    more_rows = model.estimate('{"x": 7, "y": 7}', COMPUTATION, json.dumps(settings))
+    assert small.seconds < more_data.seconds and small.memory_bytes < more_data.memory_bytes
+    assert small.seconds < more_rows.seconds and small.memory_bytes < more_rows.memory_bytes
+    with pytest.raises(ValueError):
+        model.estimate('{"x": 7}', "def computation(", settings_json)
+
+
+def test_rejects_over_budget():
+    controller = AdmissionController(1, 1, memory_budget=100, max_cost=Cost(10, 1000), heavy_seconds=5)
+    # The memory budget also caps a single request
+    with pytest.raises(OverBudget):
+        controller.check(Cost(1, 200))
+    with pytest.raises(OverBudget):
+        controller.check(Cost(20, 10))
+    controller.check(Cost(10, 100))
+    assert controller.stats()["rejected"] == 2
+
+
+def test_admits_by_memory_and_weighted_queues():
+    async def main():
+        controller = AdmissionController(
+            max_running=2,
+            max_queue=4,
+            memory_budget=100,
+            max_cost=Cost(100, 100),
+            heavy_seconds=5,
+            weights={"light": 2, "heavy": 1},
+        )
+        order = []
+        release = asyncio.Event()
+
+        async def task(name: str, cost: Cost):
+            async with controller.admit(cost):
+                order.append(name)
+                await release.wait()
+
+        # Takes all memory, so everything else queues
+        first = asyncio.ensure_future(task("first", Cost(1, 100)))
+        await asyncio.sleep(0)
+        queued = [
+            asyncio.ensure_future(task(name, cost))
+            for name, cost in [("heavy1", Cost(50, 10)), ("heavy2", Cost(50, 10)), ("light1", Cost(1, 10)), ("light2", Cost(1, 10))]
+        ]
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == {"light": 2, "heavy": 2}
+        with pytest.raises(AdmissionQueueFull):
+            async with controller.admit(Cost(1, 10)):
+                pass
+        release.set()
+        await asyncio.gather(first, *queued)
+        return order
+
+    # At most two run at once, light tasks get two turns for every heavy one
+    assert asyncio.run(main()) == ["first", "light1", "light2", "heavy1", "heavy2"]
+
+
+def test_skips_cancelled_waiters():
+    async def main():
+        controller = AdmissionController(1, 2, memory_budget=100, max_cost=Cost(10, 100), heavy_seconds=5)
+        order = []
+
+        async def task(name: str):
+            async with controller.admit(Cost(1, 10)):
+                order.append(name)
+
+        first = controller.admit(Cost(1, 10))
+        await first.__aenter__()
+        cancelled = asyncio.ensure_future(task("cancelled"))
+        second = asyncio.ensure_future(task("second"))
+        await asyncio.sleep(0)
+        # The first task finishes before the cancelled one gets to clean up
+        cancelled.cancel()
+        await first.__aexit__(None, None, None)
+        await second
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        return order, controller.stats()
+
+    order, stats = asyncio.run(main())
+    assert order == ["second"]
+    assert stats["running"] == 0 and stats["memory_in_use"] == 0
+    assert stats["queued"] == {"light": 0, "heavy": 0}
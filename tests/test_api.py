@@ -94,7 +94,7 @@ def request_verify_proof(
     if response.status_code == 200:
         print("Request successful!")
         response_data = response.json()
-        res = json.loads(response_data)["result"]
+        res = response_data["result"]
         return res
     else:
         raise Exception(f"Request failed with status code: {response.status_code=}, {response.text=}")
@@ -143,6 +143,29 @@ def test_integration(server):
     # Assert that selected_columns is not empty
     assert selected_columns
 
+    # Test: the same computation as a background job
+    with open(settings_path, "r") as settings_file:
+        settings = settings_file.read()
+    with open(precal_witness_path, "r") as precal_witness_file:
+        precal_witness = precal_witness_file.read()
+    response = requests.post(f"{url}/jobs/computation_to_vk", json={
+        "data_shape": json.dumps(data_shape),
+        "computation": computation,
+        "settings": settings,
+        "precal_witness": precal_witness,
+    })
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    for _ in range(600):
+        job = requests.get(f"{url}/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.5)
+    assert job["status"] == "done"
+    assert job["selected_columns"] == selected_columns
+    with open(vk_file_path, "rb") as vk_file:
+        assert base64.b64decode(job["verification_key"]) == vk_file.read()
+
     # Test: verify_proof
 
     proof_path = os.path.join(current_dir, "assets", "model.pf")
@@ -156,3 +179,88 @@ def test_integration(server):
         data_commitment_path
     )
     assert res == [51.5390625, 4.0859375]
+
+    # Test: verify_proofs, where an invalid proof does not fail the batch
+    with open(settings_path, "r") as settings_file:
+        settings_json = settings_file.read()
+    with open(proof_path, "r") as proof_file:
+        proof_json = proof_file.read()
+    with open(data_commitment_path, "r") as data_commitment_file:
+        data_commitment_json = data_commitment_file.read()
+    with open(vk_file_path, "rb") as vk_file:
+        vk_b64 = base64.b64encode(vk_file.read()).decode('utf-8')
+    response = requests.post(f"{url}/verify_proofs", json={
+        "groups": [{
+            "settings_json": settings_json,
+            "vk_b64": vk_b64,
+            "selected_columns": selected_columns,
+            "proofs": [
+                {"proof_json": proof_json, "data_commitment_json": data_commitment_json},
+                {"proof_json": "{}", "data_commitment_json": data_commitment_json},
+                {"proof_json": proof_json, "data_commitment_json": data_commitment_json},
+            ],
+        }],
+    })
+    assert response.status_code == 200
+    [group_results] = response.json()["results"]
+    assert group_results[0]["result"] == [51.5390625, 4.0859375]
+    assert "error" in group_results[1]
+    assert group_results[2]["result"] == [51.5390625, 4.0859375]
+    # The first proof was already verified through `/verify_proof`
+    assert group_results[0]["cached"]
+
+    # Test: a group with invalid settings fails on its own, not the whole batch
+    response = requests.post(f"{url}/verify_proofs", json={
+        "groups": [
+            {
+                "settings_json": "not json",
+                "vk_b64": vk_b64,
+                "selected_columns": selected_columns,
+                "proofs": [{"proof_json": proof_json, "data_commitment_json": data_commitment_json}],
+            },
+            {
+                "settings_json": settings_json,
+                "vk_b64": vk_b64,
+                "selected_columns": selected_columns,
+                "proofs": [{"proof_json": proof_json, "data_commitment_json": data_commitment_json}],
+            },
+        ],
+    })
+    assert response.status_code == 200
+    bad_group, good_group = response.json()["results"]
+    assert "error" in bad_group[0] and bad_group[0]["cached"] is False
+    assert good_group[0]["result"] == [51.5390625, 4.0859375]
+    response = requests.post(endpoint_verify_proof, json={
+        "proof_json": proof_json,
+        "settings_json": "not json",
+        "vk_b64": vk_b64,
+        "selected_columns": selected_columns,
+        "data_commitment_json": data_commitment_json,
+    })
+    assert response.status_code == 400
+
+    # Test: register the VK and verify against its ID
+    response = requests.post(f"{url}/vks", json={"settings_json": settings_json, "vk_b64": vk_b64})
+    assert response.status_code == 200
+    vk_id = response.json()["vk_id"]
+    response = requests.post(endpoint_verify_proof, json={
+        "proof_json": proof_json,
+        "vk_id": vk_id,
+        "selected_columns": selected_columns,
+        "data_commitment_json": data_commitment_json,
+    })
+    assert response.status_code == 200
+    assert response.json()["result"] == [51.5390625, 4.0859375]
+    assert requests.get(f"{url}/vks/{'0' * 64}").status_code == 404
+
+    # Test: repeated verification is served from the cache
+    res = request_verify_proof(
+        endpoint_verify_proof,
+        proof_path,
+        settings_path,
+        vk_file_path,
+        selected_columns,
+        data_commitment_path
+    )
+    assert res == [51.5390625, 4.0859375]
+    assert requests.get(f"{url}/stats").json()["verify_cache"]["hits"] >= 1
@@ -0,0 +1,145 @@
+import pickle
+import sys
+from pathlib import Path
+
+import pytest
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.artifacts import (
+    ArtifactStore,
+    FilesystemArtifactStore,
+    LocalObjectClient,
+    ObjectArtifactStore,
+    open_artifact_store,
+)
+from lib.cache import DiskLRUCache, cached_file
+
+
+@pytest.fixture(params=["filesystem", "object"])
+def store(request, tmp_path: Path):
+    if request.param == "filesystem":
+        return FilesystemArtifactStore(str(tmp_path / "shared"))
+    return ObjectArtifactStore(LocalObjectClient(str(tmp_path / "bucket")), "artifacts/")
+
+
+def test_publish_and_fetch(store, tmp_path: Path):
+    src = tmp_path / "model.vk"
+    src.write_bytes(b"vk-bytes")
+    assert store.fetch("k" * 64, str(tmp_path / "missing")) is None
+    assert not (tmp_path / "missing").exists()
+
+    store.publish("k" * 64, str(src), {"selected_columns": ["x"]})
+    dst = tmp_path / "fetched.vk"
+    assert store.fetch("k" * 64, str(dst)) == {"selected_columns": ["x"]}
+    assert dst.read_bytes() == b"vk-bytes"
+    assert store.stats() == {"hits": 1, "misses": 1, "corrupted": 0, "published": 1}
+    # No temporary files are left behind
+    assert sorted(p.name for p in tmp_path.iterdir() if p.is_file()) == ["fetched.vk", "model.vk"]
+
+
+def test_corrupted_artifact_is_a_miss(store, tmp_path: Path):
+    src = tmp_path / "model.compiled"
+    src.write_bytes(b"compiled")
+    store.publish("c" * 64, str(src), {})
+    # Damage the stored file behind the store's back
+    stored = [
+        p for p in tmp_path.rglob("*")
+        if p.is_file() and p != src and p.read_bytes() == b"compiled"
+    ]
+    assert len(stored) == 1
+    stored[0].write_bytes(b"truncat")
+
+    dst = tmp_path / "fetched"
+    assert store.fetch("c" * 64, str(dst)) is None
+    assert not dst.exists()
+    assert store.stats()["corrupted"] == 1
+    # The damaged artifact was removed, so it is published again by the next producer
+    assert store.fetch("c" * 64, str(dst)) is None
+    assert store.stats()["corrupted"] == 1
+
+
+def test_stores_pickle_for_workers(store, tmp_path: Path):
+    src = tmp_path / "model.vk"
+    src.write_bytes(b"vk")
+    store.publish("p" * 64, str(src), {})
+    copy = pickle.loads(pickle.dumps(store))
+    assert copy.stats()["published"] == 0
+    assert copy.fetch("p" * 64, str(tmp_path / "copy.vk")) == {}
+
+
+def test_cached_file_shares_artifacts_between_replicas(tmp_path: Path):
+    shared = FilesystemArtifactStore(str(tmp_path / "shared"))
+    calls = []
+
+    def produce(path):
+        def write():
+            calls.append(path)
+            Path(path).write_bytes(b"compiled")
+            return {"n": 1}
+        return write
+
+    # Two replicas with their own local caches
+    for replica in ("a", "b"):
+        cache = DiskLRUCache(str(tmp_path / replica / "cache"), 1024)
+        path = str(tmp_path / replica / "model.compiled")
+        assert cached_file(cache, "key", path, produce(path), shared) == {"n": 1}
+        assert Path(path).read_bytes() == b"compiled"
+        assert cache.get("key") is not None
+    assert len(calls) == 1
+
+
+class UnreachableClient(LocalObjectClient):
+    def put_object(self, name, data):
+        raise ConnectionError("store unreachable")
+
+    def get_object(self, name):
+        raise ConnectionError("store unreachable")
+
+    def upload_file(self, path, name):
+        raise ConnectionError("store unreachable")
+
+    def download_file(self, name, path):
+        raise ConnectionError("store unreachable")
+
+
+def test_cached_file_survives_an_unreachable_store(tmp_path: Path):
+    shared = ObjectArtifactStore(UnreachableClient(str(tmp_path / "bucket")), "artifacts/")
+    cache = DiskLRUCache(str(tmp_path / "cache"), 1024)
+    path = tmp_path / "model.compiled"
+
+    def produce():
+        path.write_bytes(b"compiled")
+        return {"n": 1}
+
+    assert cached_file(cache, "key", str(path), produce, shared) == {"n": 1}
+    assert path.read_bytes() == b"compiled"
+    assert cache.get("key") is not None
+
+
+def test_partial_backends_fail_when_created():
+    class RecordsOnly(ArtifactStore):
+        def _get_record(self, key):
+            return None
+
+        def _put_record(self, key, data):
+            pass
+
+    with pytest.raises(TypeError):
+        RecordsOnly()
+
+
+def test_object_names_stay_in_the_bucket(tmp_path: Path):
+    client = LocalObjectClient(str(tmp_path / "bucket"))
+    with pytest.raises(ValueError):
+        client.put_object("../escape", b"")
+
+
+def test_open_artifact_store(tmp_path: Path):
+    assert open_artifact_store("") is None
+    assert isinstance(open_artifact_store(f"file://{tmp_path}/shared"), FilesystemArtifactStore)
+    store = open_artifact_store(f"local-object://{tmp_path}/bucket")
+    assert isinstance(store, ObjectArtifactStore) and isinstance(store.client, LocalObjectClient)
+    with pytest.raises(ValueError):
+        open_artifact_store("ftp://host/path")
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.cache import DiskLRUCache, LRUCache, cached_file, content_hash, normalize_json
+
+
+def test_normalize_json_ignores_formatting():
+    assert normalize_json('{"b": 1, "a": [1, 2]}') == normalize_json('{"a":[1,2],"b":1}')
+
+
+def test_content_hash_is_unambiguous():
+    assert content_hash("ab", "c") != content_hash("a", "bc")
+    assert content_hash("a", b"b") == content_hash(b"a", "b")
+
+
+def test_disk_lru_cache_hit_and_miss(tmp_path: Path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=1024)
+    assert cache.get("k") is None
+    cache.put("k", b"vk-bytes", {"selected_columns": ["x"]})
+    entry = cache.get("k")
+    assert entry is not None
+    assert Path(entry.path).read_bytes() == b"vk-bytes"
+    assert entry.meta == {"selected_columns": ["x"]}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    # Checking again leaves the counters alone
+    assert cache.get("k", count=False) is not None
+    assert cache.get("other", count=False) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+    # Entries persist across instances
+    assert DiskLRUCache(str(tmp_path), max_bytes=1024).get("k") is not None
+
+
+def test_disk_lru_cache_evicts_least_recently_used(tmp_path: Path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=10)
+    cache.put("a", b"12345", {})
+    os.utime(cache.get("a").path, (time.time() - 10, time.time() - 10))
+    cache.put("b", b"12345", {})
+    cache.put("c", b"12345", {})
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cached_file_produces_once(tmp_path: Path):
+    cache = DiskLRUCache(str(tmp_path / "cache"), max_bytes=1024)
+    calls = []
+
+    def produce(path: Path):
+        def write():
+            calls.append(path)
+            path.write_bytes(b"onnx")
+            return {"selected_columns": ["x"]}
+        return write
+
+    first = tmp_path / "first.onnx"
+    assert cached_file(cache, "k", str(first), produce(first)) == {"selected_columns": ["x"]}
+    second = tmp_path / "second.onnx"
+    assert cached_file(cache, "k", str(second), produce(second)) == {"selected_columns": ["x"]}
+    assert second.read_bytes() == b"onnx"
+    assert calls == [first]
+
+    # Without a cache, the artifact is always produced
+    third = tmp_path / "third.onnx"
+    cached_file(None, "k", str(third), produce(third))
+    assert calls == [first, third]
+
+
+def test_lru_cache():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", ("result", [1.0]))
+    cache.put("b", ("error", "invalid proof"))
+    assert cache.get("a") == ("result", [1.0])
+    cache.put("c", ("result", [2.0]))
+    # "b" was the least recently used
+    assert cache.get("b") is None
+    assert cache.get("c") == ("result", [2.0])
+    assert cache.stats() == {"entries": 2, "hits": 2, "misses": 1, "evictions": 1, "hit_rate": 2 / 3}
@@ -0,0 +1,45 @@
+import gzip
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.encoding import ORJSON_AVAILABLE, compress, compress_chunks, dumps_json, negotiate_encoding, negotiate_media_type, read_chunks
+
+OFFERED = ["application/json", "application/octet-stream", "multipart/mixed"]
+
+
+def test_negotiate_media_type():
+    assert negotiate_media_type(None, OFFERED) == "application/json"
+    assert negotiate_media_type("*/*", OFFERED) == "application/json"
+    assert negotiate_media_type("application/json, text/plain, */*", OFFERED) == "application/json"
+    assert negotiate_media_type("application/octet-stream", OFFERED) == "application/octet-stream"
+    assert negotiate_media_type("multipart/*", OFFERED) == "multipart/mixed"
+    assert negotiate_media_type("application/json;q=0.5, application/octet-stream", OFFERED) == "application/octet-stream"
+    assert negotiate_media_type("application/octet-stream;q=0, */*", OFFERED) == "application/json"
+    assert negotiate_media_type("text/html", OFFERED) is None
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("gzip, deflate, br") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("identity") is None
+
+
+def test_compress_chunks_gzip():
+    data = b"vk-bytes" * 10000
+    chunks = read_chunks(io.BytesIO(data))
+    assert gzip.decompress(b"".join(compress_chunks(chunks, "gzip"))) == data
+    assert gzip.decompress(compress(data, "gzip")) == data
+    assert compress(data, None) == data
+
+
+@pytest.mark.skipif(not ORJSON_AVAILABLE, reason="orjson is not installed")
+def test_dumps_json_matches_orjson():
+    content = {"result": [51.5390625, 4.0859375], "cached": False, "error": "é"}
+    assert dumps_json(content) == dumps_json(content, use_orjson=True)
@@ -0,0 +1,42 @@
+import os
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.jobs import JobStore, process_alive, process_owner
+from lib.timing import run_with_progress
+
+
+def test_job_store_persists_state(tmp_path: Path):
+    job_id = "a" * 64
+    JobStore(str(tmp_path)).save(job_id, {"status": "done", "vk_id": "b" * 64})
+    assert JobStore(str(tmp_path)).load(job_id) == {"status": "done", "vk_id": "b" * 64}
+    assert JobStore(str(tmp_path)).load("c" * 64) is None
+    assert JobStore(str(tmp_path)).load("../jobs") is None
+
+
+def staged(job_store: JobStore, job_id: str, timings):
+    with timings.stage("compile"):
+        stage_seen = job_store.read_progress(job_id)
+    return stage_seen
+
+
+def test_run_with_progress_reports_current_stage(tmp_path: Path):
+    job_store = JobStore(str(tmp_path))
+    job_id = "a" * 64
+    stage_seen, durations = run_with_progress(job_store.progress_path(job_id), staged, job_store, job_id)
+    assert stage_seen == "compile"
+    assert list(durations) == ["compile"]
+    job_store.clear_progress(job_id)
+    assert job_store.read_progress(job_id) is None
+
+
+def test_process_alive():
+    assert process_alive(os.getpid())
+    owner = process_owner()
+    assert process_alive(owner["pid"], owner["started"])
+    # A process that reuses the PID of a dead one
+    if owner["started"] is not None:
+        assert not process_alive(owner["pid"], owner["started"] + "0")
@@ -14,13 +14,12 @@ from lib import extract_safe_computation, ExtractComputationFailure
 
 def execute_computation(tmp_path: Path, computation_str: str):
     data_shape = {"x": 7, "y": 7}
-    module_path = tmp_path / "test_module.py"
     precal_witness_path = tmp_path / "precal_witness.json"
     dummy_data_path = tmp_path / "dummy_data.json"
     sel_dummy_data_path = tmp_path / "sel_dummy_data.json"
     model_path = tmp_path / "model.onnx"
 
-    extracted_computation = extract_safe_computation(computation_str, str(module_path))
+    extracted_computation = extract_safe_computation(computation_str)
     selected_columns, _, verifier_model = computation_to_model(
         extracted_computation,
         str(precal_witness_path),
@@ -87,3 +86,19 @@ def computation(state, args):
     """
     with pytest.raises(NameError, match="name 'globals' is not defined"):
         execute_computation(tmp_path, invalid_computation)
+
+def test_extract_safe_computation_cached():
+    computation = """
+def computation(state, args):
+    return state.mean(args["x"])
+    """
+    other_computation = """
+def computation(state, args):
+    return state.median(args["x"])
+    """
+    extracted_computation = extract_safe_computation(computation)
+    assert extract_safe_computation(computation) is extracted_computation
+    other_extracted_computation = extract_safe_computation(other_computation)
+    # Each computation lives in its own module
+    assert other_extracted_computation.__module__ != extracted_computation.__module__
+    assert sys.modules[extracted_computation.__module__].computation is extracted_computation
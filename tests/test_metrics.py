@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.metrics import Histogram, render_samples
+
+
+def test_histogram():
+    histogram = Histogram("duration_seconds", "Durations.", ("endpoint",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, endpoint="/a")
+    histogram.observe(0.5, endpoint="/a")
+    histogram.observe(2.0, endpoint="/a")
+    histogram.observe(0.5, endpoint="/b")
+    assert histogram.render() == [
+        "# HELP duration_seconds Durations.",
+        "# TYPE duration_seconds histogram",
+        'duration_seconds_bucket{endpoint="/a",le="0.1"} 1',
+        'duration_seconds_bucket{endpoint="/a",le="1.0"} 2',
+        'duration_seconds_bucket{endpoint="/a",le="+Inf"} 3',
+        'duration_seconds_sum{endpoint="/a"} 2.55',
+        'duration_seconds_count{endpoint="/a"} 3',
+        'duration_seconds_bucket{endpoint="/b",le="0.1"} 0',
+        'duration_seconds_bucket{endpoint="/b",le="1.0"} 1',
+        'duration_seconds_bucket{endpoint="/b",le="+Inf"} 1',
+        'duration_seconds_sum{endpoint="/b"} 0.5',
+        'duration_seconds_count{endpoint="/b"} 1',
+    ]
+
+
+def test_histogram_without_observations():
+    histogram = Histogram("duration_seconds", "Durations.", ("endpoint",))
+    assert histogram.render() == ["# HELP duration_seconds Durations.", "# TYPE duration_seconds histogram"]
+
+
+def test_render_samples():
+    lines = render_samples("queue_depth", "gauge", "Queued tasks.", [({"pool": 'a"b\\c\n'}, 3), ({}, 0.5)])
+    assert lines == [
+        "# HELP queue_depth Queued tasks.",
+        "# TYPE queue_depth gauge",
+        'queue_depth{pool="a\\"b\\\\c\\n"} 3.0',
+        "queue_depth 0.5",
+    ]
@@ -0,0 +1,64 @@
+import marshal
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.profiling import ProfileStore, run_profiled
+
+
+def parse_model(timings):
+    with timings.stage("staging"):
+        sum(range(1000))
+    with timings.stage("setup"):
+        sorted(range(1000), reverse=True)
+    return "vk"
+
+
+def test_run_profiled_profiles_each_stage(tmp_path: Path):
+    progress_path = tmp_path / "progress"
+    res, durations, stats = run_profiled(str(progress_path), parse_model)
+    assert res == "vk"
+    assert set(durations) == {"staging", "setup"}
+    assert set(stats) == {"staging", "setup", "other"}
+    # Functions are attributed to the stage they ran in
+    assert any(func[2] == "<built-in method builtins.sorted>" for func in marshal.loads(stats["setup"]))
+    assert not any(func[2] == "<built-in method builtins.sorted>" for func in marshal.loads(stats["staging"]))
+    assert progress_path.read_text() == "setup"
+
+
+def test_profile_store_keeps_the_newest_profiles(tmp_path: Path):
+    store = ProfileStore(str(tmp_path), max_profiles=2)
+    _, durations, stats = run_profiled(None, parse_model)
+    ids = [store.save("/computation_to_vk", "sampled", durations, stats) for _ in range(3)]
+    assert [meta["profile_id"] for meta in store.list()] == ids[:0:-1]
+    assert store.meta(ids[0]) is None
+    assert store.meta("../enabled") is None
+
+    report = store.report(ids[2])
+    assert report.startswith("/computation_to_vk (sampled)")
+    assert "== setup (" in report and "sorted" in report
+    assert store.report(ids[2], "compile") is None
+    assert marshal.loads(store.dump(ids[2], "setup")) == marshal.loads(stats["setup"])
+    assert len(marshal.loads(store.dump(ids[2]))) >= len(marshal.loads(stats["setup"]))
+
+
+def test_profile_ids_sort_by_creation(tmp_path: Path):
+    store = ProfileStore(str(tmp_path), max_profiles=1)
+    ids = [store.save("/verify_proof", "enabled", {}, {}) for _ in range(50)]
+    assert ids == sorted(ids)
+    # Saved within the same clock tick or not, each profile outlives the ones before it
+    assert [meta["profile_id"] for meta in store.list()] == ids[-1:]
+
+
+def test_profile_store_toggle(tmp_path: Path):
+    store = ProfileStore(str(tmp_path), max_profiles=2)
+    assert not store.enabled
+    store.set_enabled(True)
+    # The flag is shared by every store on the same directory, e.g. in other server processes
+    assert ProfileStore(str(tmp_path), max_profiles=2).enabled
+    store.set_enabled(False)
+    store.set_enabled(False)
+    assert not store.enabled
+    assert store.list() == []
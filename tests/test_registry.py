@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.registry import VKRegistry
+
+
+def test_register_and_lookup(tmp_path: Path):
+    registry = VKRegistry(str(tmp_path))
+    vk_id = registry.register('{"logrows": 12}', b"vk-bytes")
+    settings_path, vk_path = registry.lookup(vk_id)
+    assert Path(settings_path).read_text() == '{"logrows": 12}'
+    assert Path(vk_path).read_bytes() == b"vk-bytes"
+
+
+def test_register_is_content_addressed(tmp_path: Path):
+    registry = VKRegistry(str(tmp_path))
+    vk_id = registry.register('{"logrows": 12}', b"vk-bytes")
+    assert registry.register('{ "logrows" : 12 }', b"vk-bytes") == vk_id
+    assert registry.register('{"logrows": 13}', b"vk-bytes") != vk_id
+    assert registry.register('{"logrows": 12}', b"other-vk") != vk_id
+
+
+def test_lookup_rejects_unknown_and_malformed_ids(tmp_path: Path):
+    registry = VKRegistry(str(tmp_path))
+    assert registry.lookup("0" * 64) is None
+    assert registry.lookup("../etc") is None
+
+
+def test_register_file_matches_register(tmp_path: Path):
+    registry = VKRegistry(str(tmp_path / "registry"))
+    vk_path = tmp_path / "model.vk"
+    vk_path.write_bytes(b"vk-bytes")
+    vk_id = registry.register_file('{"logrows": 12}', str(vk_path))
+    assert vk_id == registry.register('{"logrows": 12}', b"vk-bytes")
+    assert Path(registry.lookup(vk_id)[1]).read_bytes() == b"vk-bytes"
+
+
+def test_least_recently_used_keys_are_evicted(tmp_path: Path):
+    # Each entry takes 16 bytes of VK and 2 bytes of settings
+    registry = VKRegistry(str(tmp_path), max_bytes=40)
+    first = registry.register('{}', b"a" * 16)
+    second = registry.register('{}', b"b" * 16)
+    # Age both, then use the first so that the second is the least recently used
+    past = time.time() - 60
+    for vk_id in (first, second):
+        os.utime(tmp_path / vk_id, (past, past))
+    assert registry.lookup(first) is not None
+    third = registry.register('{}', b"c" * 16)
+    assert registry.lookup(second) is None
+    assert registry.lookup(first) is not None and registry.lookup(third) is not None
+    assert registry.evictions == 1
+    # A key larger than the limit is still kept, its ID is returned
+    large = registry.register('{}', b"d" * 64)
+    assert registry.lookup(large) is not None
@@ -0,0 +1,62 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.singleflight import SingleFlight
+
+
+def test_single_flight_coalesces_identical_calls(tmp_path: Path):
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "vk"
+
+    async def main():
+        flight = SingleFlight(str(tmp_path))
+        results = await asyncio.gather(*(flight.run("key", work) for _ in range(5)))
+        assert flight.stats() == {"in_flight": 0, "coalesced": 4}
+        return results
+
+    assert asyncio.run(main()) == ["vk"] * 5
+    assert len(calls) == 1
+    # Lock files are removed once the work is done
+    assert os.listdir(tmp_path) == []
+
+
+def test_single_flight_serializes_across_instances(tmp_path: Path):
+    # Separate instances stand in for separate server processes sharing `lock_dir`
+    published = {}
+    calls = []
+
+    async def work():
+        if "key" in published:
+            return published["key"]
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        published["key"] = "vk"
+        return "vk"
+
+    async def main():
+        flights = [SingleFlight(str(tmp_path), poll_interval=0.01) for _ in range(3)]
+        return await asyncio.gather(*(flight.run("key", work) for flight in flights))
+
+    assert asyncio.run(main()) == ["vk"] * 3
+    assert len(calls) == 1
+
+
+def test_single_flight_propagates_errors(tmp_path: Path):
+    async def work():
+        raise ValueError("invalid computation")
+
+    async def main():
+        flight = SingleFlight(str(tmp_path))
+        return await asyncio.gather(*(flight.run("key", work) for _ in range(2)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
@@ -0,0 +1,38 @@
+import json
+import pickle
+import sys
+from pathlib import Path
+
+import pytest
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.srs import SRSStore, SRSUnavailable, srs_logrows
+
+
+def test_srs_logrows():
+    settings_json = (current_dir / "assets" / "settings.json").read_text()
+    assert srs_logrows(settings_json) == 12
+    assert srs_logrows(json.dumps({"run_args": {"logrows": 14, "commitment": "KZG"}})) == 14
+    assert srs_logrows(json.dumps({"run_args": {"logrows": 14, "commitment": "IPA"}})) is None
+
+
+def test_ensure_uses_existing_file(tmp_path: Path):
+    store = SRSStore(str(tmp_path), download=False)
+    (tmp_path / "kzg12.srs").write_bytes(b"srs")
+    assert store.ensure(12) == str(tmp_path / "kzg12.srs")
+    with pytest.raises(SRSUnavailable):
+        store.ensure(13)
+
+
+def test_preload_maps_files(tmp_path: Path):
+    store = SRSStore(str(tmp_path), download=False)
+    (tmp_path / "kzg12.srs").write_bytes(b"srs-bytes")
+    store.preload([12, 12])
+    assert store.stats() == {"mapped": {"12": 9}}
+    # Workers get the same store without the mappings
+    copy = pickle.loads(pickle.dumps(store))
+    assert copy.srs_dir == store.srs_dir and copy.stats() == {"mapped": {}}
+    store.close()
+    assert store.stats() == {"mapped": {}}
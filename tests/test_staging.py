@@ -0,0 +1,55 @@
+import os
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.staging import ScratchDirs, link_or_copy
+from lib.timing import Timings, run_timed
+
+
+def test_scratch_dirs_are_reused_and_emptied(tmp_path: Path):
+    scratch_dirs = ScratchDirs(str(tmp_path), size=1)
+    with scratch_dirs.acquire() as first:
+        (Path(first) / "proof.json").write_text("{}")
+        os.mkdir(Path(first) / "0")
+    with scratch_dirs.acquire() as second:
+        assert second == first
+        assert os.listdir(second) == []
+    scratch_dirs.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_scratch_dirs_grow_on_demand(tmp_path: Path):
+    scratch_dirs = ScratchDirs(str(tmp_path), size=1)
+    with scratch_dirs.acquire() as first, scratch_dirs.acquire() as second:
+        assert first != second
+    # Only `size` directories are kept once released
+    assert len(os.listdir(scratch_dirs.root)) == 1
+    scratch_dirs.close()
+
+
+def test_link_or_copy(tmp_path: Path):
+    src = tmp_path / "model.vk"
+    src.write_bytes(b"vk-bytes")
+    dst = tmp_path / "linked.vk"
+    link_or_copy(str(src), str(dst))
+    src.unlink()
+    assert dst.read_bytes() == b"vk-bytes"
+
+
+def timed_sum(a: int, b: int, timings: Timings):
+    with timings.stage("add"):
+        return a + b
+
+
+def test_run_timed_returns_durations():
+    res, durations = run_timed(timed_sum, 1, 2)
+    assert res == 3
+    assert list(durations) == ["add"]
+    timings = Timings()
+    timings.update(durations)
+    timings.update(durations)
+    assert timings.durations["add"] == 2 * durations["add"]
+    assert timings.server_timing().startswith("add;dur=")
@@ -0,0 +1,94 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.streaming import MessageTooLarge, map_unordered, read_lines
+
+
+async def chunks_of(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(iterator) -> list:
+    return [item async for item in iterator]
+
+
+def test_read_lines_splits_across_chunks():
+    chunks = chunks_of(b'{"id": 1}\n{"id"', b': 2}\n\n', b'{"id": 3}')
+    assert asyncio.run(collect(read_lines(chunks, 64))) == [b'{"id": 1}', b'{"id": 2}', b'{"id": 3}']
+
+
+def test_read_lines_limits_message_size():
+    with pytest.raises(MessageTooLarge):
+        asyncio.run(collect(read_lines(chunks_of(b"short\n", b"x" * 10, b"x" * 10), 16)))
+    with pytest.raises(MessageTooLarge):
+        asyncio.run(collect(read_lines(chunks_of(b"x" * 20 + b"\nshort\n"), 16)))
+
+
+def test_map_unordered_yields_results_as_they_complete():
+    async def main():
+        async def delayed(item):
+            await asyncio.sleep(item / 100)
+            return item
+
+        return await collect(map_unordered(chunks_of(3, 1, 2), delayed, 3))
+
+    assert asyncio.run(main()) == [1, 2, 3]
+
+
+def test_map_unordered_bounds_work_in_flight():
+    async def main():
+        in_flight = 0
+        peak = 0
+        read = 0
+        done = 0
+        peak_unfinished = 0
+
+        async def items():
+            nonlocal read, peak_unfinished
+            for i in range(10):
+                read += 1
+                peak_unfinished = max(peak_unfinished, read - done)
+                yield i
+
+        async def work(item):
+            nonlocal in_flight, peak, done
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            done += 1
+            return item
+
+        results = await collect(map_unordered(items(), work, 2))
+        return sorted(results), peak, peak_unfinished
+
+    results, peak, peak_unfinished = asyncio.run(main())
+    assert results == list(range(10))
+    assert peak == 2
+    # Besides the calls in flight, only the item waiting for a free slot has been read
+    assert peak_unfinished == 3
+
+
+def test_map_unordered_raises_errors_of_the_input():
+    async def main():
+        async def items():
+            yield 1
+            raise ValueError("bad input")
+
+        async def work(item):
+            return item
+
+        results = []
+        with pytest.raises(ValueError, match="bad input"):
+            async for result in map_unordered(items(), work, 2):
+                results.append(result)
+        return results
+
+    assert asyncio.run(main()) in ([], [1])
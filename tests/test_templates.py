@@ -0,0 +1,40 @@
+import ast
+import sys
+from pathlib import Path
+
+import pytest
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.templates import TEMPLATES, UnknownTemplate, render_template
+
+
+def test_render_template():
+    assert render_template("mean", ["x"]) == (
+        "def computation(state: State, args: Args):\n"
+        '    return state.mean(args["x"])\n'
+    )
+    assert 'state.correlation(args["x"], args["y"])' in render_template("correlation", ["x", "y"], '{"x": 7, "y": 7}')
+
+
+def test_every_template_renders_valid_python():
+    for template in TEMPLATES.values():
+        columns = [f"c{i}" for i in range(template.arity)]
+        tree = ast.parse(render_template(template.name, columns))
+        assert tree.body[0].name == "computation"
+
+
+def test_column_names_are_quoted():
+    computation = render_template("mean", ['x"]); import os; ("'])
+    call = ast.parse(computation).body[0].body[0].value
+    assert call.args[0].slice.value == 'x"]); import os; ("'
+
+
+def test_render_template_rejects_invalid_requests():
+    with pytest.raises(UnknownTemplate):
+        render_template("mode", ["x"])
+    with pytest.raises(ValueError, match="takes 2 column"):
+        render_template("correlation", ["x"])
+    with pytest.raises(ValueError, match="not in data_shape: y"):
+        render_template("linear_regression", ["x", "y"], '{"x": 7}')
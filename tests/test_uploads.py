@@ -0,0 +1,97 @@
+import asyncio
+import hashlib
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib.uploads import UploadStore, UploadStoreFull, UploadTooLarge, UploadedFile, payload_key, write_payload
+
+
+async def chunks_of(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def test_receive_and_lookup(tmp_path: Path):
+    store = UploadStore(str(tmp_path), max_bytes=1024, ttl=3600, max_total_bytes=4096)
+    uploaded, size = asyncio.run(store.receive(chunks_of(b'{"Mean_0": ', b'[1.0]}')))
+    assert size == 17
+    assert uploaded.digest == hashlib.sha256(b'{"Mean_0": [1.0]}').hexdigest()
+    assert Path(uploaded.path).read_bytes() == b'{"Mean_0": [1.0]}'
+    assert store.lookup(uploaded.digest) == uploaded
+    assert store.lookup("0" * 64) is None
+    assert store.lookup("../etc") is None
+
+
+def test_receive_rejects_oversized_upload(tmp_path: Path):
+    store = UploadStore(str(tmp_path), max_bytes=4, ttl=3600, max_total_bytes=4096)
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(store.receive(chunks_of(b"abc", b"def")))
+    # Nothing is left behind
+    assert os.listdir(tmp_path) == []
+
+
+def test_prune_removes_unused_uploads(tmp_path: Path):
+    store = UploadStore(str(tmp_path), max_bytes=1024, ttl=60, max_total_bytes=4096)
+    uploaded, _ = asyncio.run(store.receive(chunks_of(b"proof")))
+    os.utime(uploaded.path, (0, 0))
+    store.prune()
+    assert store.lookup(uploaded.digest) is None
+
+
+def test_least_recently_used_uploads_are_evicted(tmp_path: Path):
+    store = UploadStore(str(tmp_path), max_bytes=16, ttl=3600, max_total_bytes=24)
+    first, _ = asyncio.run(store.receive(chunks_of(b"a" * 10)))
+    second, _ = asyncio.run(store.receive(chunks_of(b"b" * 10)))
+    past = time.time() - 60
+    os.utime(first.path, (past, past))
+    os.utime(second.path, (past + 1, past + 1))
+    # Using the first makes the second the least recently used
+    assert store.lookup(first.digest) is not None
+    third, _ = asyncio.run(store.receive(chunks_of(b"c" * 10)))
+    assert store.lookup(second.digest) is None
+    assert store.lookup(first.digest) is not None and store.lookup(third.digest) is not None
+    assert store.evictions == 1
+
+
+def test_concurrent_uploads_are_limited_in_total(tmp_path: Path):
+    store = UploadStore(str(tmp_path), max_bytes=16, ttl=3600, max_total_bytes=24)
+
+    async def main():
+        started = asyncio.Event()
+
+        async def slow_chunks():
+            yield b"a" * 16
+            started.set()
+            await asyncio.sleep(0.1)
+
+        slow = asyncio.ensure_future(store.receive(slow_chunks()))
+        await started.wait()
+        with pytest.raises(UploadStoreFull):
+            await store.receive(chunks_of(b"b" * 16))
+        await slow
+        # Once received, the space counts towards the stored uploads instead
+        return await store.receive(chunks_of(b"b" * 16))
+
+    asyncio.run(main())
+    assert [name for name in os.listdir(tmp_path) if not name.startswith(".tmp-")] == [hashlib.sha256(b"b" * 16).hexdigest()]
+
+
+def test_payload_key_and_write_payload(tmp_path: Path):
+    uploaded_path = tmp_path / "upload"
+    uploaded_path.write_text('{"b": 1, "a": 2}')
+    uploaded = UploadedFile(str(uploaded_path), "ab" * 32)
+    assert payload_key('{"b": 1, "a": 2}') == '{"b": 1, "a": 2}'
+    assert payload_key('{"b": 1, "a": 2}', normalize=True) == '{"a":2,"b":1}'
+    assert payload_key(uploaded, normalize=True) == "upload:" + "ab" * 32
+
+    write_payload(uploaded, str(tmp_path / "from_upload.json"))
+    write_payload('{"c": 3}', str(tmp_path / "inline.json"))
+    assert (tmp_path / "from_upload.json").read_text() == '{"b": 1, "a": 2}'
+    assert (tmp_path / "inline.json").read_text() == '{"c": 3}'
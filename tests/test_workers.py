@@ -0,0 +1,166 @@
+import asyncio
+import os
+import signal
+import sys
+import time
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pytest
+
+current_dir = Path(__file__).parent
+sys.path.append(str(current_dir.parent))
+
+from lib import workers
+from lib.workers import Limits, PoolSaturated, TaskLimitExceeded, TaskTimeout, WorkerPool
+
+
+def slow_square(x: int) -> int:
+    time.sleep(0.5)
+    return x * x
+
+
+def test_worker_pool_runs_tasks():
+    async def main():
+        pool = WorkerPool("test", max_workers=2, max_queue=2)
+        try:
+            return await asyncio.gather(*(pool.run(pow, i, 2) for i in range(4)))
+        finally:
+            pool.shutdown()
+
+    assert asyncio.run(main()) == [0, 1, 4, 9]
+
+
+def test_worker_pool_rejects_when_saturated():
+    async def main():
+        pool = WorkerPool("test", max_workers=1, max_queue=1, retry_after=7)
+        try:
+            running = [asyncio.ensure_future(pool.run(slow_square, i)) for i in range(2)]
+            await asyncio.sleep(0)
+            assert pool.queue_depth == 1
+            with pytest.raises(PoolSaturated) as exc_info:
+                await pool.run(slow_square, 3)
+            assert exc_info.value.retry_after == 7
+            assert await asyncio.gather(*running) == [0, 1]
+            assert pool.in_flight == 0
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
+
+
+def warm_up():
+    time.sleep(0.2)
+
+
+def fail_warm_up():
+    raise RuntimeError("warm-up failed")
+
+
+def test_worker_pool_starts_warm_workers():
+    async def main():
+        pool = WorkerPool("test", max_workers=2, max_queue=0, preload=("json",), warm_up=warm_up)
+        try:
+            assert not pool.ready
+            await pool.start()
+            assert pool.ready
+            assert pool.stats()["ready"]
+            assert await pool.run(pow, 3, 2) == 9
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
+
+
+def test_worker_pool_reports_failed_warm_up():
+    async def main():
+        pool = WorkerPool("test", max_workers=1, max_queue=0, warm_up=fail_warm_up)
+        try:
+            with pytest.raises(BrokenProcessPool):
+                await pool.start()
+            assert not pool.ready
+            assert pool.warm_up_error is not None
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
+
+
+def loop_forever():
+    while True:
+        pass
+
+
+def sleep_uninterruptibly():
+    # Stands in for native code that never returns to Python
+    signal.signal(signal.SIGALRM, signal.SIG_IGN)
+    time.sleep(30)
+
+
+def test_worker_pool_interrupts_task_over_limits():
+    async def main():
+        pool = WorkerPool("test", max_workers=1, max_queue=0, limits=Limits(timeout=0.5))
+        try:
+            pid = await pool.run(os.getpid)
+            with pytest.raises(TaskLimitExceeded):
+                await pool.run(loop_forever)
+            # The worker survives
+            assert await pool.run(os.getpid) == pid
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
+
+
+def test_worker_pool_enforces_cpu_limit():
+    async def main():
+        pool = WorkerPool("test", max_workers=1, max_queue=0, limits=Limits(cpu_seconds=1))
+        try:
+            with pytest.raises(TaskLimitExceeded):
+                await pool.run(loop_forever)
+            assert await pool.run(pow, 2, 3) == 8
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
+
+
+def test_worker_pool_kills_stuck_task(monkeypatch):
+    monkeypatch.setattr(workers, "KILL_GRACE", 0.5)
+
+    async def main():
+        pool = WorkerPool("test", max_workers=1, max_queue=0, limits=Limits(timeout=0.5))
+        try:
+            pid = await pool.run(os.getpid)
+            with pytest.raises(TaskTimeout):
+                await pool.run(sleep_uninterruptibly)
+            # The worker was replaced
+            assert await pool.run(os.getpid) != pid
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
+
+
+def test_worker_pool_kill_spares_other_workers(monkeypatch):
+    monkeypatch.setattr(workers, "KILL_GRACE", 0.5)
+
+    async def run_later(pool):
+        # Runs on the other worker from 1.2s to 1.8s, while the stuck task is killed at 1.5s
+        await asyncio.sleep(1.2)
+        return await pool.run(slow_square, 3)
+
+    async def main():
+        pool = WorkerPool("test", max_workers=2, max_queue=0, limits=Limits(timeout=1))
+        try:
+            await pool.start()
+            stuck, other = await asyncio.gather(
+                pool.run(sleep_uninterruptibly), run_later(pool), return_exceptions=True
+            )
+            assert isinstance(stuck, TaskTimeout)
+            assert other == 9
+            assert pool.in_flight == 0
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())